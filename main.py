@@ -1,19 +1,35 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Header
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Request, Query, File, Form, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose.exceptions import JWTError
 import sqlite3
 import os
 import json
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import gzip
+import time
+import hashlib
+import threading
+import sys
+import re
+from array import array
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
+
+# Optional speedups: fall back to stdlib json / gzip-only when not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 load_dotenv()
 
@@ -22,6 +38,72 @@ SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 
+# Response compression (payloads below the threshold are sent uncompressed)
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Sheet caching (seconds). Admin "refresh" and source edits invalidate early.
+SNAPSHOT_TTL_SECONDS = float(os.getenv("SNAPSHOT_TTL_SECONDS", "60"))
+SOURCES_TTL_SECONDS = float(os.getenv("SOURCES_TTL_SECONDS", "30"))
+ETAG_REGISTRY_SIZE = int(os.getenv("ETAG_REGISTRY_SIZE", "4096"))
+# Default number of points per dashboard performance curve (0 = every student)
+DASHBOARD_CURVE_POINTS = int(os.getenv("DASHBOARD_CURVE_POINTS", "200"))
+# Graded tables kept per (snapshot, grading config, manual overrides) combination
+GRADE_CACHE_SIZE = int(os.getenv("GRADE_CACHE_SIZE", "64"))
+# Source circuit breakers: consecutive failures before a source is skipped, and
+# how long it is skipped (doubling per failed probe up to the maximum)
+SOURCE_BREAKER_FAILURES = int(os.getenv("SOURCE_BREAKER_FAILURES", "3"))
+SOURCE_BREAKER_OPEN_SECONDS = float(os.getenv("SOURCE_BREAKER_OPEN_SECONDS", "30"))
+SOURCE_BREAKER_MAX_OPEN_SECONDS = float(os.getenv("SOURCE_BREAKER_MAX_OPEN_SECONDS", "600"))
+# How long "no marks found for this roll number" is answered without searching again
+MISSING_ROLL_TTL_SECONDS = float(os.getenv("MISSING_ROLL_TTL_SECONDS", "30"))
+MISSING_ROLL_CACHE_SIZE = int(os.getenv("MISSING_ROLL_CACHE_SIZE", "4096"))
+# /api/marks lookup: "race" queries candidate sheets concurrently and answers from
+# the first one that lists the student, "sequential" checks them in source order.
+# A sheet download slower than the MARKS_HEDGE_PERCENTILE of recent downloads is
+# re-requested once (0 = never hedge).
+MARKS_LOOKUP_MODE = os.getenv("MARKS_LOOKUP_MODE", "race")
+MARKS_LOOKUP_WORKERS = int(os.getenv("MARKS_LOOKUP_WORKERS", "8"))
+MARKS_HEDGE_PERCENTILE = float(os.getenv("MARKS_HEDGE_PERCENTILE", "95"))
+MARKS_HEDGE_MIN_SAMPLES = int(os.getenv("MARKS_HEDGE_MIN_SAMPLES", "20"))
+# Maximum of the current assessments, unless every mark column of a sheet declares
+# its own maximum in the header (e.g. "Quiz 1 (10)", "Mid [25]")
+CURRENT_MARKS_MAXIMUM = float(os.getenv("CURRENT_MARKS_MAXIMUM", "55"))
+
+# SQLite tuning (per-thread pooled connections)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "8192"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+# User directory cache and write-behind queue for Sheets appends.
+# Write-behind is off on Vercel by default: /tmp (the journal) does not outlive the function.
+USERS_TTL_SECONDS = float(os.getenv("USERS_TTL_SECONDS", "30"))
+USERS_MISS_RELOAD_SECONDS = float(os.getenv("USERS_MISS_RELOAD_SECONDS", "5"))
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "0" if os.getenv("VERCEL") else "1") == "1"
+WRITE_BEHIND_INTERVAL_SECONDS = float(os.getenv("WRITE_BEHIND_INTERVAL_SECONDS", "2"))
+WRITE_BEHIND_MAX_BACKOFF_SECONDS = float(os.getenv("WRITE_BEHIND_MAX_BACKOFF_SECONDS", "300"))
+WRITE_BEHIND_BATCH_LIMIT = int(os.getenv("WRITE_BEHIND_BATCH_LIMIT", "500"))
+WRITE_BEHIND_RETENTION_SECONDS = float(os.getenv("WRITE_BEHIND_RETENTION_SECONDS", "900"))
+
+# Sheets API transport: each thread gets its own keep-alive HTTP connection
+SHEETS_HTTP_TIMEOUT_SECONDS = float(os.getenv("SHEETS_HTTP_TIMEOUT_SECONDS", "30"))
+
+# Bulk student import: password hashing workers (0 = one per CPU)
+BULK_HASH_WORKERS = int(os.getenv("BULK_HASH_WORKERS", "0")) or (os.cpu_count() or 2)
+
+# Admission control: per route class concurrency, queue length and queue deadline.
+# Each can be overridden with ADMISSION_<CLASS>_CONCURRENCY / _QUEUE / _WAIT_SECONDS.
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "1") == "1"
+ADMISSION_DEFAULTS = {
+    "auth": (os.cpu_count() or 2, 64, 3.0),      # bcrypt logins, registrations, imports
+    "reports": (4, 16, 10.0),                    # Sheets-heavy admin reports
+    "lookup": (64, 256, 5.0),                    # student mark lookups
+}
+ADMISSION_RETRY_AFTER_MAX_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_MAX_SECONDS", "60"))
+
 # Database path configuration for Vercel (read-only filesystem)
 if os.path.exists("/tmp"):
     DATABASE_PATH = "/tmp/portal.db"
@@ -30,14 +112,27 @@ else:
     DATABASE_PATH = "portal.db"
     print(f"Using local database at {DATABASE_PATH}")
 
+# Shared snapshot store: one SQLite file that every worker/instance on the host
+# reads, so sheets are downloaded once per TTL instead of once per worker
+SNAPSHOT_STORE_ENABLED = os.getenv("SNAPSHOT_STORE_ENABLED", "1") == "1"
+SNAPSHOT_STORE_PATH = os.getenv("SNAPSHOT_STORE_PATH") or os.path.join(os.path.dirname(DATABASE_PATH), "portal-snapshots.db")
+SNAPSHOT_STORE_CHECK_SECONDS = float(os.getenv("SNAPSHOT_STORE_CHECK_SECONDS", "2"))
+SNAPSHOT_LEASE_SECONDS = float(os.getenv("SNAPSHOT_LEASE_SECONDS", "30"))
+SNAPSHOT_LEASE_WAIT_SECONDS = float(os.getenv("SNAPSHOT_LEASE_WAIT_SECONDS", "10"))
+
 # Global variables
 sheets_service = None
 student_cache = []
+sheet_snapshots = {}  # (sheet_id, range) -> snapshot dict
+_snapshot_lock = threading.Lock()
+_sources_cache = {"rows": None, "rowIndex": {}, "fetchedAt": 0.0, "loadStartedAt": 0.0, "firstAdminLoaded": False, "firstAdmin": None}
+_user_directory = {}  # env var name -> {"sheetId", "users", "byRoll", "fetchedAt"}
+_sources_tab_ids = {}  # config sheet id -> numeric id of its "Sources" tab
 
 # Database initialization
 def init_db():
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db()
         cursor = conn.cursor()
 
         # Students table
@@ -84,6 +179,33 @@ def init_db():
             )
         ''')
 
+        # Manual grade version per sheet (bumped on every write, shared by all workers)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS manual_grade_versions (
+                sheet_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        # Write-behind journal for Sheets appends (registrations, new sources)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pending_sheet_appends (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                spreadsheet_id TEXT NOT NULL,
+                range TEXT NOT NULL,
+                row_json TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                flushed_at REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_pending_sheet_appends_target
+            ON pending_sheet_appends (spreadsheet_id, range, flushed_at)
+        ''')
+
         # Initialize Default Admin if Env Vars set (Persistence for Vercel)
         admin_email = os.getenv("ADMIN_EMAIL")
         admin_pass = os.getenv("ADMIN_PASSWORD")
@@ -115,6 +237,90 @@ def init_db():
 
 sheet_init_error = None
 
+class SharedCredentials:
+    """
+    Service account credentials shared by every thread's transport.
+    Only one thread refreshes an expired access token; the others wait and reuse it.
+    """
+
+    def __init__(self, credentials):
+        self._credentials = credentials
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._credentials, name)
+
+    def refresh(self, request):
+        with self._lock:
+            self._credentials.refresh(request)
+
+    def before_request(self, request, method, url, headers):
+        if not self._credentials.valid:
+            with self._lock:
+                if not self._credentials.valid:
+                    self._credentials.refresh(request)
+        self._credentials.apply(headers)
+
+class LazySheetsService:
+    """
+    Stands in for the Sheets API client until the first call.
+    The Google client libraries are only imported then, and the client is
+    built from the discovery document bundled with googleapiclient, so
+    no request is made to the discovery service.
+
+    httplib2 transports are not thread-safe, so every thread (FastAPI's
+    threadpool, run_in_executor workers, the warmup and write-behind threads)
+    gets its own client and keep-alive connection. All of them share one set
+    of credentials and one access token.
+    """
+
+    def __init__(self, credentials_dict: Dict[str, Any]):
+        self._credentials_dict = credentials_dict
+        self._credentials = None
+        self._document = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _shared(self):
+        global sheet_init_error
+        if self._document is None:
+            with self._lock:
+                if self._document is None:
+                    started = time.time()
+                    try:
+                        from google.oauth2 import service_account
+                        from googleapiclient import discovery_cache
+                        credentials = service_account.Credentials.from_service_account_info(
+                            self._credentials_dict,
+                            scopes=['https://www.googleapis.com/auth/spreadsheets']
+                        )
+                        document = discovery_cache.get_static_doc('sheets', 'v4')
+                        if document is None:
+                            raise RuntimeError("googleapiclient does not bundle the sheets v4 discovery document")
+                        self._credentials = SharedCredentials(credentials)
+                        self._document = json.loads(document)
+                    except Exception as e:
+                        sheet_init_error = str(e)
+                        print(f"✗ Google Sheets client build failed: {e}")
+                        raise
+                    print(f"✓ Google Sheets client loaded in {(time.time() - started) * 1000:.0f}ms")
+        return self._credentials, self._document
+
+    def _client(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            from googleapiclient.discovery import build_from_document
+            credentials, document = self._shared()
+            http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=SHEETS_HTTP_TIMEOUT_SECONDS))
+            service = build_from_document(document, http=http)
+            self._local.service = service
+        return service
+
+    def spreadsheets(self):
+        return self._client().spreadsheets()
+
 def initialize_google_sheets():
     global sheets_service, sheet_init_error
     try:
@@ -125,11 +331,11 @@ def initialize_google_sheets():
             return False
 
         credentials_dict = json.loads(credentials_json)
-        credentials = service_account.Credentials.from_service_account_info(
-            credentials_dict,
-            scopes=['https://www.googleapis.com/auth/spreadsheets']
-        )
-        sheets_service = build('sheets', 'v4', credentials=credentials)
+        missing = [k for k in ("client_email", "private_key", "token_uri") if not credentials_dict.get(k)]
+        if missing:
+            raise ValueError(f"Service account info is missing {', '.join(missing)}")
+        # The client itself is built on first use (see LazySheetsService)
+        sheets_service = LazySheetsService(credentials_dict)
         print("✓ Google Sheets initialized")
         return True
     except Exception as e:
@@ -137,6 +343,699 @@ def initialize_google_sheets():
         print(f"✗ Google Sheets initialization failed: {e}")
         return False
 
+def _header_range_for(range_val: str) -> str:
+    """Header row range for a data range (e.g. data at Sheet1!A3:Z -> headers at Sheet1!2:2)"""
+    header_row = 1
+    sheet_part = "Sheet1"
+
+    if "!" in range_val:
+        sheet_part, range_part = range_val.split("!", 1)
+    else:
+        range_part = range_val
+
+    match = re.search(r'([0-9]+)', range_part)
+    if match:
+        data_start_row = int(match.group(1))
+        if data_start_row > 1:
+            header_row = data_start_row - 1
+
+    return f"{sheet_part}!{header_row}:{header_row}"
+
+def _fetch_sheet_values(sheet_id: str, range_val: str):
+    """
+    Fetch (headers, rows) of a marking sheet in one batchGet. Headers exclude the
+    Roll/Name columns. Cells are formatted values, exactly as shown in the sheet,
+    so roll numbers keep leading zeros and marks keep their displayed precision.
+    """
+    result = sheets_service.spreadsheets().values().batchGet(
+        spreadsheetId=sheet_id,
+        ranges=[_header_range_for(range_val), range_val]
+    ).execute()
+    header_range, data_range = result.get('valueRanges', [{}, {}])
+    header_rows = header_range.get('values', [])
+    headers = header_rows[0][2:] if header_rows and len(header_rows[0]) > 2 else []
+    return headers, data_range.get('values', [])
+
+# Source circuit breakers
+# A source (sheet id + range) that keeps failing is not re-fetched on every
+# request. Permission/not-found/bad-range errors open its breaker at once,
+# other errors after SOURCE_BREAKER_FAILURES in a row. While open, reads fail
+# fast with the last error; once the open period is over a single request is
+# let through as a probe (half-open) and its outcome closes or re-opens it.
+_source_breakers = {}  # (sheet_id, range) -> breaker state dict
+_fetch_latencies = deque(maxlen=200)  # seconds per successful sheet download, most recent last
+_breaker_lock = threading.Lock()
+
+class SourceUnavailable(Exception):
+    pass
+
+def _is_source_config_error(error: Exception) -> bool:
+    err_str = str(error)
+    return "403" in err_str or "404" in err_str or "Unable to parse" in err_str
+
+def source_breaker_check(key):
+    """Raise SourceUnavailable while the source's breaker is open"""
+    with _breaker_lock:
+        breaker = _source_breakers.get(key)
+        if breaker is None or breaker["state"] == "closed":
+            return
+        now = time.time()
+        if breaker["state"] == "open" and now >= breaker["retryAt"]:
+            breaker.update(state="half-open", probeStartedAt=now)
+            return
+        # A probe that never reported back (e.g. its worker died) is replaced
+        if breaker["state"] == "half-open" and now - breaker["probeStartedAt"] > SHEETS_HTTP_TIMEOUT_SECONDS:
+            breaker["probeStartedAt"] = now
+            return
+        wait = max(0, breaker["retryAt"] - now)
+        raise SourceUnavailable(f"{breaker['lastError']} (source paused, retrying in {wait:.0f}s)")
+
+def source_breaker_success(key):
+    with _breaker_lock:
+        _source_breakers.pop(key, None)
+
+def source_breaker_failure(key, error: Exception):
+    now = time.time()
+    with _breaker_lock:
+        breaker = _source_breakers.setdefault(key, {"state": "closed", "failures": 0, "opens": 0, "retryAt": 0.0})
+        breaker["failures"] += 1
+        breaker["lastError"] = str(error)[:300]
+        breaker["lastFailureAt"] = now
+        if (breaker["state"] == "half-open" or _is_source_config_error(error)
+                or breaker["failures"] >= SOURCE_BREAKER_FAILURES):
+            open_seconds = min(SOURCE_BREAKER_MAX_OPEN_SECONDS, SOURCE_BREAKER_OPEN_SECONDS * 2 ** breaker["opens"])
+            breaker.update(state="open", retryAt=now + open_seconds)
+            breaker["opens"] += 1
+            print(f"⚠ Source {key[0]} ({key[1]}) paused for {open_seconds:.0f}s: {breaker['lastError']}")
+
+def source_health(sheet_id: str, range_val: str) -> Dict[str, Any]:
+    """Breaker state of a source for the admin sources list"""
+    with _breaker_lock:
+        breaker = _source_breakers.get((sheet_id, range_val))
+        if breaker is None:
+            return {"state": "closed", "failures": 0, "lastError": None}
+        return {
+            "state": breaker["state"],
+            "failures": breaker["failures"],
+            "lastError": breaker["lastError"],
+            "lastFailureAt": breaker["lastFailureAt"],
+            "retryAt": breaker["retryAt"] if breaker["state"] == "open" else None
+        }
+
+def reset_source_breakers(sheet_id: Optional[str] = None):
+    with _breaker_lock:
+        for key in list(_source_breakers):
+            if sheet_id is None or key[0] == sheet_id:
+                del _source_breakers[key]
+
+# Roll numbers recently searched for and not found on any sheet. Only answers
+# built from every candidate sheet are remembered (no read errors), and the
+# cache is cleared whenever sources change or any sheet's content changes.
+_missing_rolls = OrderedDict()  # (endpoint, normalized roll, scope) -> (expires_at, detail)
+_missing_rolls_lock = threading.Lock()
+
+def missing_roll_detail(key) -> Optional[str]:
+    with _missing_rolls_lock:
+        entry = _missing_rolls.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del _missing_rolls[key]
+            return None
+        return entry[1]
+
+def remember_missing_roll(key, detail: str):
+    if MISSING_ROLL_TTL_SECONDS <= 0:
+        return
+    with _missing_rolls_lock:
+        _missing_rolls[key] = (time.time() + MISSING_ROLL_TTL_SECONDS, detail)
+        _missing_rolls.move_to_end(key)
+        while len(_missing_rolls) > MISSING_ROLL_CACHE_SIZE:
+            _missing_rolls.popitem(last=False)
+
+def forget_missing_rolls():
+    with _missing_rolls_lock:
+        _missing_rolls.clear()
+
+# Sheet snapshot cache
+# Every marking sheet is downloaded at most once per SNAPSHOT_TTL_SECONDS and
+# shared by all endpoints. The version is a content hash, so re-fetching an
+# unchanged sheet keeps the same version (and the same ETags).
+#
+# With the shared store enabled, the in-process dict is only a first level:
+# each worker re-checks the store's version stamp every
+# SNAPSHOT_STORE_CHECK_SECONDS, and a stale sheet is re-fetched by whichever
+# worker takes its refresh lease while the others keep serving the old copy.
+def get_sheet_snapshot(sheet_id: str, range_val: str, max_age: Optional[float] = None):
+    """Return the cached {headers, rows, version} of a sheet, re-fetching when stale"""
+    ttl = SNAPSHOT_TTL_SECONDS if max_age is None else max_age
+    key = (sheet_id, range_val)
+    now = time.time()
+    snapshot = sheet_snapshots.get(key)
+    if snapshot and now - snapshot["fetchedAt"] < ttl:
+        if not SNAPSHOT_STORE_ENABLED or now - snapshot["checkedAt"] < SNAPSHOT_STORE_CHECK_SECONDS:
+            return snapshot
+
+    if not SNAPSHOT_STORE_ENABLED:
+        return _download_snapshot(sheet_id, range_val)
+
+    try:
+        stored = _load_stored_snapshot(key, snapshot)
+        if stored and now - stored["fetchedAt"] < ttl:
+            return stored
+        return _refresh_shared_snapshot(key, ttl, stale=stored or snapshot)
+    except sqlite3.Error as e:
+        print(f"⚠ Snapshot store unavailable, fetching directly: {e}")
+        return _download_snapshot(sheet_id, range_val)
+
+def cached_snapshot_version(sheet_id: str, range_val: str) -> Optional[str]:
+    """
+    Version of the copy held locally or in the shared store, without
+    downloading. None when there is no copy younger than SNAPSHOT_TTL_SECONDS.
+    """
+    key = (sheet_id, range_val)
+    now = time.time()
+    snapshot = sheet_snapshots.get(key)
+    if snapshot is None:
+        return None
+    if SNAPSHOT_STORE_ENABLED and (now - snapshot["checkedAt"] >= SNAPSHOT_STORE_CHECK_SECONDS
+                                   or now - snapshot["fetchedAt"] >= SNAPSHOT_TTL_SECONDS):
+        try:
+            snapshot = _load_stored_snapshot(key, snapshot)
+        except sqlite3.Error:
+            pass
+    if snapshot is None or now - snapshot["fetchedAt"] >= SNAPSHOT_TTL_SECONDS:
+        return None
+    return snapshot["version"]
+
+def _make_snapshot(sheet_id, range_val, headers, rows, version=None, fetched_at=None):
+    return {
+        "sheetId": sheet_id,
+        "range": range_val,
+        "headers": headers,
+        "rows": rows,
+        "version": version or hashlib.sha1(dumps_json([headers, rows])).hexdigest()[:16],
+        "fetchedAt": fetched_at or time.time(),
+        "checkedAt": time.time()
+    }
+
+def _remember_snapshot(snapshot):
+    with _snapshot_lock:
+        key = (snapshot["sheetId"], snapshot["range"])
+        previous = sheet_snapshots.get(key)
+        sheet_snapshots[key] = snapshot
+    if previous is None or previous["version"] != snapshot["version"]:
+        forget_missing_rolls()
+    index_snapshot_rolls(snapshot)
+    return snapshot
+
+def _download_snapshot(sheet_id: str, range_val: str):
+    key = (sheet_id, range_val)
+    source_breaker_check(key)
+    started = time.perf_counter()
+    try:
+        headers, rows = _fetch_sheet_values(sheet_id, range_val)
+    except Exception as e:
+        source_breaker_failure(key, e)
+        raise
+    _fetch_latencies.append(time.perf_counter() - started)
+    source_breaker_success(key)
+    return _remember_snapshot(_make_snapshot(sheet_id, range_val, headers, rows))
+
+def _snapshot_store():
+    conn = get_db(SNAPSHOT_STORE_PATH)
+    if not getattr(_db_local, "snapshot_schema_ready", False):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sheet_snapshots (
+                sheet_id TEXT NOT NULL,
+                range TEXT NOT NULL,
+                version TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (sheet_id, range)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS snapshot_leases (
+                sheet_id TEXT NOT NULL,
+                range TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (sheet_id, range)
+            )
+        ''')
+        conn.commit()
+        _db_local.snapshot_schema_ready = True
+    return conn
+
+def _load_stored_snapshot(key, local=None):
+    """The store's copy of a sheet; reuses the local copy when the version matches"""
+    conn = _snapshot_store()
+    try:
+        row = conn.execute(
+            "SELECT version, fetched_at FROM sheet_snapshots WHERE sheet_id = ? AND range = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        if local and local["version"] == row["version"]:
+            local["fetchedAt"] = row["fetched_at"]
+            local["checkedAt"] = time.time()
+            index_snapshot_rolls(local)
+            return local
+        payload = conn.execute(
+            "SELECT payload FROM sheet_snapshots WHERE sheet_id = ? AND range = ?", key
+        ).fetchone()
+    finally:
+        conn.close()
+    if payload is None:
+        return None
+    import zlib
+    data = json.loads(zlib.decompress(payload["payload"]))
+    return _remember_snapshot(_make_snapshot(key[0], key[1], data["headers"], data["rows"], row["version"], row["fetched_at"]))
+
+def _store_snapshot(snapshot):
+    import zlib
+    payload = zlib.compress(dumps_json({"headers": snapshot["headers"], "rows": snapshot["rows"]}), 6)
+    conn = _snapshot_store()
+    try:
+        conn.execute(
+            """INSERT INTO sheet_snapshots (sheet_id, range, version, fetched_at, payload) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(sheet_id, range) DO UPDATE SET
+                   version = excluded.version, fetched_at = excluded.fetched_at, payload = excluded.payload""",
+            (snapshot["sheetId"], snapshot["range"], snapshot["version"], snapshot["fetchedAt"], payload)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def _lease_owner() -> str:
+    return f"{os.getpid()}:{threading.get_ident()}"
+
+def _acquire_snapshot_lease(key) -> bool:
+    now = time.time()
+    conn = _snapshot_store()
+    try:
+        cursor = conn.execute(
+            """INSERT INTO snapshot_leases (sheet_id, range, owner, expires_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(sheet_id, range) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+               WHERE snapshot_leases.expires_at < ?""",
+            (key[0], key[1], _lease_owner(), now + SNAPSHOT_LEASE_SECONDS, now)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+def _release_snapshot_lease(key):
+    conn = _snapshot_store()
+    try:
+        conn.execute(
+            "DELETE FROM snapshot_leases WHERE sheet_id = ? AND range = ? AND owner = ?",
+            (key[0], key[1], _lease_owner())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def _refresh_shared_snapshot(key, ttl: float, stale=None):
+    """Re-fetch a stale sheet once for all workers (lease holder fetches, others wait or serve stale)"""
+    if _acquire_snapshot_lease(key):
+        try:
+            snapshot = _download_snapshot(*key)
+            _store_snapshot(snapshot)
+            return snapshot
+        finally:
+            _release_snapshot_lease(key)
+
+    # Another worker is refreshing this sheet
+    if stale:
+        return stale
+    deadline = time.time() + SNAPSHOT_LEASE_WAIT_SECONDS
+    while time.time() < deadline:
+        time.sleep(0.1)
+        stored = _load_stored_snapshot(key)
+        if stored and time.time() - stored["fetchedAt"] < ttl:
+            return stored
+    # Lease holder is slow or gone: fetch without sharing
+    return _download_snapshot(*key)
+
+def invalidate_snapshots(sheet_id: Optional[str] = None):
+    """Drop cached snapshots (all of them, or every range of one sheet) in every worker"""
+    with _snapshot_lock:
+        for key in list(sheet_snapshots):
+            if sheet_id is None or key[0] == sheet_id:
+                del sheet_snapshots[key]
+    if SNAPSHOT_STORE_ENABLED:
+        try:
+            conn = _snapshot_store()
+            try:
+                if sheet_id is None:
+                    conn.execute("DELETE FROM sheet_snapshots")
+                else:
+                    conn.execute("DELETE FROM sheet_snapshots WHERE sheet_id = ?", (sheet_id,))
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠ Snapshot store invalidation failed: {e}")
+    drop_roll_index(sheet_id)
+    reset_source_breakers(sheet_id)
+    forget_missing_rolls()
+
+# Roll number index
+# Normalized roll number -> {(sheet_id, range): [row positions in the snapshot]}.
+# Each snapshot re-indexes only its own sheet when it is downloaded or loaded
+# from the shared store, so the index is kept current one source at a time.
+# It answers "which sheets contain this student" without reading sheet data.
+_roll_index = {}
+_roll_index_sheets = {}  # (sheet_id, range) -> {"version", "fetchedAt", "indexedAt", "rolls"}
+_roll_index_lock = threading.Lock()
+
+def normalize_roll(roll) -> str:
+    return str(roll).strip().lower()
+
+def index_snapshot_rolls(snapshot):
+    key = (snapshot["sheetId"], snapshot["range"])
+    with _roll_index_lock:
+        entry = _roll_index_sheets.get(key)
+        if entry and entry["version"] == snapshot["version"]:
+            entry["indexedAt"] = time.time()
+            return
+        # A slower download of an older copy must not replace a newer index
+        if entry and entry["fetchedAt"] > snapshot["fetchedAt"]:
+            return
+
+        positions = {}
+        for position, row in enumerate(snapshot["rows"]):
+            if row and len(row) >= 2:
+                positions.setdefault(normalize_roll(row[0]), []).append(position)
+
+        for roll in (entry["rolls"] if entry else ()):
+            sheets = _roll_index.get(roll)
+            if sheets is not None:
+                sheets.pop(key, None)
+                if not sheets:
+                    del _roll_index[roll]
+        for roll, rows in positions.items():
+            _roll_index.setdefault(roll, {})[key] = rows
+        _roll_index_sheets[key] = {"version": snapshot["version"], "fetchedAt": snapshot["fetchedAt"],
+                                   "indexedAt": time.time(), "rolls": frozenset(positions)}
+
+def drop_roll_index(sheet_id: Optional[str] = None):
+    """Forget the index entries of one sheet (or all sheets)"""
+    with _roll_index_lock:
+        for key in [k for k in _roll_index_sheets if sheet_id is None or k[0] == sheet_id]:
+            for roll in _roll_index_sheets.pop(key)["rolls"]:
+                sheets = _roll_index.get(roll)
+                if sheets is not None:
+                    sheets.pop(key, None)
+                    if not sheets:
+                        del _roll_index[roll]
+
+def roll_memberships(roll: str) -> Dict[tuple, List[int]]:
+    """{(sheet_id, range): [row positions]} of every indexed sheet that lists this roll number"""
+    with _roll_index_lock:
+        return {key: list(rows) for key, rows in _roll_index.get(normalize_roll(roll), {}).items()}
+
+def indexed_version(sheet_id: str, range_val: str) -> Optional[str]:
+    """
+    Snapshot version the index holds for a sheet, or None when it cannot be
+    trusted to say "not on this sheet": the version must be the cached
+    snapshot's and that snapshot must still be within SNAPSHOT_TTL_SECONDS.
+    """
+    key = (sheet_id, range_val)
+    entry = _roll_index_sheets.get(key)
+    snapshot = sheet_snapshots.get(key)
+    if (entry and snapshot and snapshot["version"] == entry["version"]
+            and time.time() - snapshot["fetchedAt"] < SNAPSHOT_TTL_SECONDS):
+        return entry["version"]
+    return None
+
+def _get_sources_rows(config_sheet_id: str):
+    """Raw rows of the Sources tab, cached for SOURCES_TTL_SECONDS"""
+    if _sources_cache["rows"] is not None and time.time() - _sources_cache["fetchedAt"] < SOURCES_TTL_SECONDS:
+        return _sources_cache["rows"]
+    load_started = time.time()
+    result = sheets_service.spreadsheets().values().get(
+        spreadsheetId=config_sheet_id,
+        range="Sources!A:D"
+    ).execute()
+    rows = result.get('values', [])
+    _sources_cache.update(rows=rows, rowIndex=_index_source_rows(rows), fetchedAt=time.time(),
+                          loadStartedAt=load_started, firstAdminLoaded=False, firstAdmin=None)
+    return rows
+
+def invalidate_sources_cache():
+    _sources_cache.update(rows=None, rowIndex={}, fetchedAt=0.0, loadStartedAt=0.0, firstAdminLoaded=False, firstAdmin=None)
+    forget_missing_rolls()
+
+def _index_source_rows(rows):
+    """Map sheet_id -> 1-based row numbers in the Sources tab (row 1 is the header)"""
+    index = {}
+    for idx, row in enumerate(rows[1:], 2):
+        if row and row[0].strip():
+            index.setdefault(row[0].strip(), []).append(idx)
+    return index
+
+def _set_cached_source_rows(rows):
+    """Apply a local edit to the cached Sources table without re-reading it"""
+    _sources_cache.update(rows=rows, rowIndex=_index_source_rows(rows))
+    forget_missing_rolls()
+
+def _sources_tab_id(config_sheet_id: str) -> int:
+    """Numeric sheetId of the Sources tab (needed for row deletes)"""
+    if config_sheet_id not in _sources_tab_ids:
+        meta = sheets_service.spreadsheets().get(
+            spreadsheetId=config_sheet_id,
+            fields="sheets.properties(sheetId,title)"
+        ).execute()
+        for tab in meta.get('sheets', []):
+            props = tab.get('properties', {})
+            if props.get('title') == "Sources":
+                _sources_tab_ids[config_sheet_id] = props.get('sheetId')
+                break
+        else:
+            raise Exception("'Sources' tab not found in Admin Sheet")
+    return _sources_tab_ids[config_sheet_id]
+
+_sources_edit_lock = threading.Lock()
+
+@contextmanager
+def sources_tab_edit(config_sheet_id: str):
+    """
+    Serialize row-number based edits of the Sources tab: between threads with a
+    lock, and between workers on this host with a lease in the snapshot store,
+    so rows cannot shift between locating and editing them.
+    """
+    key = ("sources-tab", config_sheet_id)
+    with _sources_edit_lock:
+        leased = False
+        if SNAPSHOT_STORE_ENABLED:
+            try:
+                deadline = time.time() + SNAPSHOT_LEASE_WAIT_SECONDS
+                leased = _acquire_snapshot_lease(key)
+                while not leased and time.time() < deadline:
+                    time.sleep(0.1)
+                    leased = _acquire_snapshot_lease(key)
+                if not leased:
+                    raise HTTPException(status_code=503, detail="Sources are being edited, please retry")
+            except sqlite3.Error as e:
+                print(f"⚠ Snapshot store unavailable, Sources edit lease skipped: {e}")
+        try:
+            yield
+        finally:
+            if leased:
+                _release_snapshot_lease(key)
+
+def locate_source_rows(config_sheet_id: str, sheet_id: str):
+    """
+    Find the Sources rows of a sheet through the cached row index, then confirm
+    them with a single read of just those rows. A stale index (rows moved by
+    another worker) triggers one reload. Returns [(row_number, row_values)].
+    """
+    for attempt in range(2):
+        cached_at = _sources_cache["fetchedAt"]
+        _get_sources_rows(config_sheet_id)
+        just_loaded = _sources_cache["fetchedAt"] != cached_at
+        row_numbers = _sources_cache["rowIndex"].get(sheet_id, [])
+        if row_numbers:
+            result = sheets_service.spreadsheets().values().batchGet(
+                spreadsheetId=config_sheet_id,
+                ranges=[f"Sources!A{n}:D{n}" for n in row_numbers]
+            ).execute()
+            live_rows = [(r.get('values') or [[]])[0] for r in result.get('valueRanges', [])]
+            if all(row and row[0].strip() == sheet_id for row in live_rows):
+                return list(zip(row_numbers, live_rows))
+        elif just_loaded:
+            # Not in a freshly read table: really not there
+            return []
+        invalidate_sources_cache()
+    return []
+
+# Compact student records
+# A sheet's header labels are stored once as an interned tuple shared by every
+# record of that sheet, and marks are kept as a float array aligned to it.
+# Non-numeric cells (e.g. "Absent") are stored as NaN with the text kept
+# aside. Dicts are only built when a record is serialized.
+_header_tuples = {}
+_TEXT_MARK = float("nan")
+
+def intern_headers(headers) -> tuple:
+    """Return the shared tuple for a list of header labels"""
+    key = tuple(headers)
+    shared = _header_tuples.get(key)
+    if shared is None:
+        shared = _header_tuples.setdefault(key, tuple(sys.intern(str(h)) for h in key))
+    return shared
+
+_NUMBER_PATTERN = re.compile(r'^\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?\s*%?\s*$')
+
+def parse_mark(cell):
+    """Numeric value of a mark cell: 0.0 when blank, None when it is text (e.g. "Absent")"""
+    if not cell:
+        return 0.0
+    if _NUMBER_PATTERN.match(cell):
+        return float(cell.replace('%', '').strip())
+    return None
+
+class StudentRecord:
+    __slots__ = ("rollNumber", "name", "headers", "marks", "text", "total")
+
+    def __init__(self, row, headers: tuple, marks=None, text=None):
+        """
+        Parse one sheet row (roll, name, marks...). Marks past the headers are ignored.
+        Callers that already converted the row (see SheetSchema) pass marks/text.
+        """
+        self.rollNumber = row[0].strip()
+        self.name = row[1].strip()
+        self.headers = headers
+        if marks is None:
+            marks = array("d")
+            for i, mark in enumerate(row[2:2 + len(headers)]):
+                value = parse_mark(mark)
+                if value is None:
+                    value = _TEXT_MARK
+                    if text is None:
+                        text = {}
+                    text[i] = mark
+                marks.append(value)
+        self.marks = marks
+        self.text = text
+        total = 0.0
+        for i, value in enumerate(marks):
+            if value == value and headers[i].lower() != 'total':
+                total += value
+        self.total = total
+
+    def mark(self, i: int):
+        if self.text and i in self.text:
+            return self.text[i]
+        return self.marks[i]
+
+    def marks_dict(self) -> Dict[str, Any]:
+        return {label: self.mark(i) for i, label in zip(range(len(self.marks)), self.headers)}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'rollNumber': self.rollNumber, 'name': self.name, 'marks': self.marks_dict()}
+
+# Sheet schemas
+# Column types and maximum marks are inferred once per snapshot version, and
+# every mark column is converted to floats in a single pass over the rows. A
+# column's maximum is only taken from an explicit "(N)" or "[N]" at the end of
+# its header ("Quiz 1 (10)", "Final [40]"). The sheet's maximum is the sum of
+# those when every non-total column holding marks declares one, and
+# CURRENT_MARKS_MAXIMUM otherwise, so it never depends on the marks themselves.
+_DECLARED_MAXIMUM = re.compile(r'[\(\[]\s*(\d+(?:\.\d+)?)\s*[\)\]]\s*$')
+_sheet_schemas = {}  # (sheet_id, range) -> SheetSchema of the latest version
+
+class SheetSchema:
+    __slots__ = ("version", "headers", "types", "maximums", "maxMarks", "records", "rowPositions", "rolls")
+
+    def __init__(self, headers, rows, version=None):
+        self.version = version
+        self.headers = headers = intern_headers(headers)
+        self.rowPositions = [position for position, row in enumerate(rows) if row and len(row) >= 2]
+        rows = [rows[position] for position in self.rowPositions]
+        widths = [min(len(row) - 2, len(headers)) for row in rows]
+        columns = []
+        texts = []
+        self.types = []
+        self.maximums = []
+        all_declared = True
+        for i, label in enumerate(headers):
+            values = array("d")
+            text = {}
+            numeric = False
+            for j, row in enumerate(rows):
+                if i >= widths[j]:
+                    values.append(_TEXT_MARK)  # missing cell, never read
+                    continue
+                value = parse_mark(row[2 + i])
+                if value is None:
+                    text[j] = row[2 + i]
+                    value = _TEXT_MARK
+                elif row[2 + i]:
+                    numeric = True
+                values.append(value)
+            columns.append(values)
+            texts.append(text)
+            if not numeric:
+                self.types.append("text" if text else "empty")
+            else:
+                self.types.append("mixed" if text else "number")
+            declared = _DECLARED_MAXIMUM.search(label)
+            self.maximums.append(float(declared.group(1)) if declared else None)
+            if numeric and not declared and label.lower() != 'total':
+                all_declared = False
+
+        declared_total = sum(maximum for label, maximum in zip(headers, self.maximums)
+                             if maximum is not None and label.lower() != 'total')
+        self.maxMarks = declared_total if all_declared and declared_total > 0 else CURRENT_MARKS_MAXIMUM
+
+        self.records = []
+        for j, row in enumerate(rows):
+            width = widths[j]
+            text = {i: texts[i][j] for i in range(width) if j in texts[i]} or None
+            marks = array("d", [columns[i][j] for i in range(width)])
+            self.records.append(StudentRecord(row, headers, marks, text))
+        # Normalized roll -> record index (the last row if a roll is listed twice)
+        self.rolls = {normalize_roll(record.rollNumber): j for j, record in enumerate(self.records)}
+
+    def find_row(self, snapshot, roll: str):
+        """The snapshot row of this roll number, or None (the schema must be this snapshot's)"""
+        j = self.rolls.get(normalize_roll(roll))
+        if j is None:
+            return None
+        row = snapshot["rows"][self.rowPositions[j]]
+        return row if normalize_roll(row[0]) == normalize_roll(roll) else None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "maxMarks": self.maxMarks,
+            "columns": [{"label": label, "type": kind, "maximum": maximum}
+                        for label, kind, maximum in zip(self.headers, self.types, self.maximums)]
+        }
+
+def get_sheet_schema(snapshot) -> SheetSchema:
+    """Schema of a snapshot, inferred once per version"""
+    key = (snapshot["sheetId"], snapshot["range"])
+    schema = _sheet_schemas.get(key)
+    if schema is None or schema.version != snapshot["version"]:
+        schema = SheetSchema(snapshot["headers"], snapshot["rows"], snapshot["version"])
+        _sheet_schemas[key] = schema
+    return schema
+
+STANDARD_MARK_HEADERS = ("Quiz 1", "Assigment 1", "Mid", "Quiz 2", "Assigment 2", "CCP", "CP", "Final", "Total")
+
+def _mark_labels(headers, width: int) -> tuple:
+    """
+    Labels for a row with width mark cells: the sheet's own headers (the standard
+    ones when it has no header row), extras named Extra <i>
+    """
+    labels = tuple(headers) or STANDARD_MARK_HEADERS
+    extra = [f"Extra {i}" for i in range(len(labels), width)]
+    return intern_headers(labels + tuple(extra))
+
 def fetch_students_from_sheets():
     global student_cache
     if not sheets_service:
@@ -151,7 +1050,7 @@ def fetch_students_from_sheets():
         # Fallback to SQLite (Ephemeral) if no sheets configured
         if not sources:
             try:
-                conn = sqlite3.connect(DATABASE_PATH)
+                conn = get_db()
                 cursor = conn.cursor()
                 cursor.execute("SELECT sheet_id, range FROM sources")
                 db_sources = cursor.fetchall()
@@ -162,9 +1061,7 @@ def fetch_students_from_sheets():
                 pass
 
         all_students = []
-        # Standard headers based on user request
-        headers = ["Quiz 1", "Assigment 1", "Mid", "Quiz 2", "Assigment 2", "CCP", "CP", "Final", "Total"]
-
+        _reset_source_progress(sources)
         for source in sources:
             # Handle both old 2-item and new 3-item tuple formats
             if len(source) == 3:
@@ -178,13 +1075,11 @@ def fetch_students_from_sheets():
             print(f"Range: {range_val}")
 
             try:
+                _record_source_progress(sheet_id, range_val, "loading")
                 # Use default range if not specified or invalid (Sheet1!A2:Z skipping header)
                 # Ideally we want A1:Z to see headers, but let's assume standard structure
-                result = sheets_service.spreadsheets().values().get(
-                    spreadsheetId=sheet_id,
-                    range=range_val
-                ).execute()
-                rows = result.get('values', [])
+                snapshot = get_sheet_snapshot(sheet_id, range_val)
+                rows = snapshot["rows"]
                 print(f"Got {len(rows)} rows from sheet")
 
                 if len(rows) > 0:
@@ -197,23 +1092,11 @@ def fetch_students_from_sheets():
                             if idx < 3: # Log first 3 students
                                 print(f"  Student {idx+1}: Roll={roll_no}, Name={name}")
 
-                            # Parse marks
-                            marks_data = {}
-                            raw_marks = row[2:]
-                            for i, mark in enumerate(raw_marks):
-                                if i < len(headers):
-                                    label = headers[i]
-                                    marks_data[label] = mark
-                                else:
-                                    marks_data[f"Extra {i}"] = mark
-
-                            all_students.append({
-                                'rollNumber': roll_no,
-                                'name': name,
-                                'marks': marks_data
-                            })
+                            all_students.append(StudentRecord(row, _mark_labels(snapshot["headers"], len(row) - 2)))
                 print(f"Added {len(rows)} students from this sheet")
+                _record_source_progress(sheet_id, range_val, "warm", rows=len(rows))
             except Exception as e:
+                _record_source_progress(sheet_id, range_val, "error", error=str(e))
                 print(f"❌ Error fetching from sheet {sheet_id}: {e}")
                 import traceback
                 traceback.print_exc()
@@ -221,13 +1104,66 @@ def fetch_students_from_sheets():
         student_cache = all_students
         print(f"\n✓ Total cached: {len(all_students)} students")
         if all_students:
-            print(f"Sample roll numbers: {[s['rollNumber'] for s in all_students[:5]]}")
+            print(f"Sample roll numbers: {[s.rollNumber for s in all_students[:5]]}")
 
         return all_students
     except Exception as e:
         print(f"Error fetching students: {e}")
         return []
 
+# Startup warmup
+# The server starts accepting requests once the database and the Sheets client
+# are set up; every source is then downloaded in a background thread.
+# /api/ready reports the progress per source.
+_warmup = {"status": "idle", "startedAt": None, "finishedAt": None, "sources": {}}
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+
+def _reset_source_progress(sources):
+    with _warmup_lock:
+        previous = _warmup["sources"]
+        _warmup["sources"] = {}
+        for source in sources:
+            # The same spreadsheet can be listed more than once with different ranges
+            key = (source[0], source[1])
+            before = previous.get(key, {})
+            _warmup["sources"][key] = {
+                "sheetId": source[0],
+                "range": source[1],
+                "name": source[2] if len(source) == 3 else "Unknown",
+                # A warm sheet stays warm while it is re-read
+                "state": "warm" if before.get("state") == "warm" else "cold",
+                "rows": before.get("rows"),
+                "error": None
+            }
+
+def _record_source_progress(sheet_id: str, range_val: str, state: str, rows: Optional[int] = None, error: Optional[str] = None):
+    with _warmup_lock:
+        entry = _warmup["sources"].setdefault((sheet_id, range_val), {"sheetId": sheet_id, "range": range_val, "name": "Unknown", "rows": None})
+        if state == "loading" and entry.get("state") == "warm":
+            return
+        entry["state"] = state
+        entry["error"] = error
+        if rows is not None:
+            entry["rows"] = rows
+
+def _run_warmup():
+    started = time.time()
+    _warmup.update(status="running", startedAt=started, finishedAt=None)
+    try:
+        fetch_students_from_sheets()
+    finally:
+        _warmup.update(status="done", finishedAt=time.time())
+        print(f"✓ Warmup finished in {time.time() - started:.1f}s")
+
+def start_warmup():
+    """Download every source in the background so startup does not wait for Sheets"""
+    global _warmup_thread
+    if _warmup_thread is not None and _warmup_thread.is_alive():
+        return
+    _warmup_thread = threading.Thread(target=_run_warmup, name="sheets-warmup", daemon=True)
+    _warmup_thread.start()
+
 def ensure_cache():
     # Helper to load cache lazily if empty
     if not student_cache:
@@ -237,17 +1173,190 @@ def ensure_cache():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Initialize DB and Google Sheets connection (fast)
-    # Defer heavy fetch logic to first request
+    # Student data is fetched in the background (see /api/ready)
     init_db()
     initialize_google_sheets()
-    # Fetch student data on startup
-    print("\n🚀 Server starting - fetching student data...")
-    fetch_students_from_sheets()
+    start_write_behind()
+    print("\n🚀 Server starting - warming up student data in the background...")
+    start_warmup()
     yield
+    stop_write_behind()
+    shutdown_hash_executor()
+    shutdown_lookup_executor()
+    close_db_pool()
+
+# Admission control
+# Requests are grouped into route classes, each with its own concurrency limit
+# and a bounded wait queue, so a burst of bcrypt logins or Sheets-heavy reports
+# cannot starve cheap lookups. A request that finds its class's queue full, or
+# is still queued at the class deadline, gets an immediate 503 with a
+# Retry-After estimated from the class's recent service time.
+ADMISSION_ROUTES = {
+    "auth": ("/api/login", "/api/register", "/api/admin/login", "/api/admin/register",
+             "/api/admin/import-students"),
+    "reports": ("/api/admin/dashboard", "/api/admin/export", "/api/admin/refresh",
+                "/api/admin/calculate-grades", "/api/admin/simulate-grades",
+                "/api/admin/sheet-statistics/", "/api/admin/upload-manual-grades"),
+    "lookup": ("/api/marks/", "/api/student/", "/api/admin/search"),
+}
+
+class AdmissionClass:
+    """Concurrency slots plus a FIFO of waiting requests (event loop only, no locking)"""
+
+    def __init__(self, name: str, concurrency: int, queue_limit: int, wait_seconds: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue_limit = max(0, queue_limit)
+        self.wait_seconds = wait_seconds
+        self.active = 0
+        self.rejected = 0
+        self.admitted = 0
+        self.abandoned = 0
+        self.service_time = 0.0  # moving average, seconds
+        self._waiters = deque()
+
+    @classmethod
+    def from_env(cls, name: str, concurrency: int, queue_limit: int, wait_seconds: float):
+        prefix = f"ADMISSION_{name.upper()}_"
+        return cls(name,
+                   int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+                   int(os.getenv(prefix + "QUEUE", str(queue_limit))),
+                   float(os.getenv(prefix + "WAIT_SECONDS", str(wait_seconds))))
+
+    async def acquire(self, disconnected=None) -> Optional[bool]:
+        """
+        Take a slot, waiting up to wait_seconds in line. False = shed the request,
+        None = the client went away while queued (disconnected() returned first).
+        """
+        import asyncio
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.queue_limit:
+            self.rejected += 1
+            return False
+
+        # release() hands its slot straight to the first waiter (active stays the same)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        watcher = asyncio.ensure_future(disconnected()) if disconnected else None
+        try:
+            await asyncio.wait([f for f in (waiter, watcher) if f], timeout=self.wait_seconds,
+                               return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        finally:
+            if watcher and not watcher.done():
+                watcher.cancel()
+        if waiter.done():
+            if watcher and watcher.done() and not watcher.cancelled():
+                self.release()
+                self.abandoned += 1
+                return None
+            self.admitted += 1
+            return True
+        self._waiters.remove(waiter)
+        if watcher and watcher.done():
+            self.abandoned += 1
+            return None
+        self.rejected += 1
+        return False
+
+    def release(self, elapsed: Optional[float] = None):
+        if elapsed is not None:
+            self.service_time = elapsed if not self.service_time else 0.8 * self.service_time + 0.2 * elapsed
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained"""
+        estimate = self.service_time * (len(self._waiters) + 1) / self.concurrency
+        return max(1, min(ADMISSION_RETRY_AFTER_MAX_SECONDS, int(estimate + 0.999)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "queueLimit": self.queue_limit,
+            "waitSeconds": self.wait_seconds,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "abandoned": self.abandoned,
+            "serviceTimeMs": round(self.service_time * 1000, 1)
+        }
+
+admission_classes = {name: AdmissionClass.from_env(name, *defaults) for name, defaults in ADMISSION_DEFAULTS.items()}
+
+def admission_class_for(path: str) -> Optional[AdmissionClass]:
+    """Route class of a request path (None = not admission controlled, e.g. static files, health)"""
+    for name, prefixes in ADMISSION_ROUTES.items():
+        for prefix in prefixes:
+            if path == prefix or (prefix.endswith("/") and path.startswith(prefix)):
+                return admission_classes[name]
+    return None
+
+class AdmissionControlMiddleware:
+    """ASGI middleware: holds a slot of the request's route class until the response is sent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route_class = admission_class_for(scope["path"]) if scope["type"] == "http" and ADMISSION_CONTROL_ENABLED else None
+        if route_class is None or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        # While queued, watch for the client going away; request body messages
+        # read meanwhile are replayed to the app
+        buffered = deque()
+
+        async def disconnected():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                buffered.append(message)
+
+        async def replay_receive():
+            if buffered:
+                return buffered.popleft()
+            return await receive()
+
+        admitted = await route_class.acquire(disconnected)
+        if admitted is None:
+            return
+        if not admitted:
+            retry_after = route_class.retry_after()
+            response = json_response(
+                {"detail": "Server is busy, please retry shortly", "routeClass": route_class.name},
+                status_code=503, headers={"Retry-After": str(retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, replay_receive, send)
+        finally:
+            route_class.release(time.perf_counter() - started)
 
 # Initialize FastAPI
 app = FastAPI(title="Student Marks Portal", lifespan=lifespan)
 
+# Admission control sits inside CORS so that 503s still carry CORS headers
+app.add_middleware(AdmissionControlMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -344,9 +1453,6 @@ async def serve_admin_image():
         return FileResponse(file_path, media_type="image/png")
     raise HTTPException(status_code=404, detail="admin.png not found")
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Pydantic models
 class StudentRegister(BaseModel):
     rollNumber: str
@@ -377,6 +1483,18 @@ class GradingConfig(BaseModel):
     ranges: Optional[Dict[str, float]] = None
     limits: Optional[Dict[str, int]] = None
 
+class GradingRules(BaseModel):
+    method: str = "automatic"
+    ranges: Optional[Dict[str, float]] = None
+    limits: Optional[Dict[str, int]] = None
+
+class GradingSimulation(BaseModel):
+    sheetId: str
+    configs: List[GradingRules]
+    # Grades to diff against; defaults to the automatic grades shown in sheet statistics
+    baseline: Optional[GradingRules] = None
+    includeStudents: bool = False
+
 class ManualGradeEntry(BaseModel):
     rollNumber: str
     grade: str
@@ -387,57 +1505,537 @@ class ManualGradesPayload(BaseModel):
 
 
 # Helper functions
-def get_db():
-    conn = sqlite3.connect(DATABASE_PATH)
+
+# SQLite connection pool
+# Each thread keeps one long-lived connection (WAL journal, tuned pragmas and a
+# statement cache, so repeated queries reuse their prepared statements).
+# close() on a pooled connection only ends the transaction; the connection
+# stays open for the next get_db() on the same thread.
+_db_local = threading.local()
+_db_pool = {}  # (owning thread, database path) -> connection
+_db_pool_lock = threading.Lock()
+_db_pool_generation = 0  # bumped by close_db_pool() so threads drop their closed connections
+
+class PooledConnection:
+    """sqlite3.Connection proxy whose close() returns it to the per-thread pool"""
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    # Special methods bypass __getattr__: `with conn:` commits or rolls back as usual
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        # Discard uncommitted work so the next user starts clean
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+def _open_db_connection(path: str):
+    # check_same_thread is off only so connections of finished threads can be
+    # closed from here; each connection is still used by its owning thread only
+    conn = sqlite3.connect(
+        path,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=SQLITE_STATEMENT_CACHE,
+        check_same_thread=False
+    )
     conn.row_factory = sqlite3.Row
+    try:
+        conn.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    except sqlite3.Error as e:
+        print(f"⚠ SQLite pragma setup failed: {e}")
+    with _db_pool_lock:
+        # Reap connections whose threads have exited (worker threads can be recycled)
+        for key in [k for k in _db_pool if not k[0].is_alive()]:
+            try:
+                _db_pool.pop(key).close()
+            except Exception:
+                pass
+        _db_pool[(threading.current_thread(), path)] = conn
     return conn
 
+def get_db(path: Optional[str] = None):
+    """This thread's pooled connection to the portal database (or another SQLite file)"""
+    path = path or DATABASE_PATH
+    conns = getattr(_db_local, "conns", None)
+    # close_db_pool() closed this thread's connections too: open new ones
+    if conns is None or getattr(_db_local, "generation", None) != _db_pool_generation:
+        conns = _db_local.conns = {}
+        _db_local.generation = _db_pool_generation
+        _db_local.snapshot_schema_ready = False
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = _open_db_connection(path)
+    return PooledConnection(conn)
+
+def close_db_pool():
+    """Close every pooled connection (shutdown); threads reopen theirs on next use"""
+    global _db_pool_generation
+    with _db_pool_lock:
+        connections = list(_db_pool.values())
+        _db_pool.clear()
+        _db_pool_generation += 1
+    _db_local.conns = {}
+    for conn in connections:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+async def run_db(fn, *args):
+    """Run a blocking database helper from an async endpoint (worker thread, own connection)"""
+    return await run_in_threadpool(fn, *args)
+
+def db_fetchone(query: str, params=()):
+    conn = get_db()
+    try:
+        return conn.execute(query, params).fetchone()
+    finally:
+        conn.close()
+
+# Response helpers (large statistics payloads)
+def dumps_json(data) -> bytes:
+    """Serialize to compact JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick 'br' or 'gzip' from an Accept-Encoding header (None = identity)"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token] = q
+
+    def q_for(coding):
+        return accepted.get(coding, accepted.get("*", 0.0))
+
+    if brotli is not None and q_for("br") > 0 and q_for("br") >= q_for("gzip"):
+        return "br"
+    if q_for("gzip") > 0:
+        return "gzip"
+    return None
+
+def json_response(data, request: Optional[Request] = None, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Fast JSON response: serialize once, then gzip/brotli-compress the body
+    when it is larger than COMPRESSION_MIN_BYTES and the client accepts it.
+    """
+    body = dumps_json(data)
+    response_headers = {"Vary": "Accept-Encoding"}
+    if headers:
+        response_headers.update(headers)
+
+    if request is not None and len(body) >= COMPRESSION_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding == "br":
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=response_headers)
+
+def to_columnar(students: List[Dict[str, Any]], headers: List[str]) -> Dict[str, Any]:
+    """
+    Compact table layout: column names are sent once and each student becomes
+    a row array, with marks as an array aligned to markHeaders.
+    """
+    return {
+        "columns": ["rollNumber", "name", "total", "percentage", "grade", "marks"],
+        "markHeaders": headers,
+        "rows": [
+            [s['rollNumber'], s['name'], s['total'], s.get('percentage'), s.get('grade'),
+             [s['marks'].get(h) for h in headers]]
+            for s in students
+        ]
+    }
+
+def statistics_response(result: Dict[str, Any], request: Request, layout: Optional[str] = None,
+                        headers: Optional[Dict[str, str]] = None) -> Response:
+    """Send a sheet statistics / grading result, optionally in columnar layout"""
+    if layout == "columnar":
+        result = {
+            **result,
+            "layout": "columnar",
+            "students": to_columnar(result["students"], result["statistics"]["headers"])
+        }
+    return json_response(result, request, headers=headers)
+
+# Conditional GET (ETag / If-None-Match)
+# An ETag is issued together with the list of inputs the response was built
+# from: the scope's source list and the snapshot version of every sheet read.
+# A later If-None-Match is answered with 304 while all of those inputs are
+# still current, without grading or serializing anything.
+_etag_registry = OrderedDict()  # etag -> (key, dependencies)
+_etag_lock = threading.Lock()
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
+def grading_config_hash(config: GradingConfig) -> str:
+    """Canonical hash of a grading configuration"""
+    canonical = json.dumps(config.model_dump(), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+def sources_dependency(owner_email: Optional[str] = None):
+    sources = get_sheet_sources(owner_email)
+    signature = hashlib.sha1(dumps_json([list(s) for s in sources])).hexdigest()[:16]
+    return ("sources", owner_email, signature)
+
+def sheet_dependency(sheet_id: str, range_val: str, version: Optional[str]):
+    # version None marks a sheet that failed to load; it is never "current"
+    return ("sheet", sheet_id, range_val, version)
+
+def roll_absence_dependency(roll: str, keys) -> tuple:
+    # Sheets skipped because the roll index says the student is not on them
+    return ("roll-absent", normalize_roll(roll), tuple((sid, rng, indexed_version(sid, rng)) for sid, rng in keys))
+
+def _dependency_is_current(dep) -> bool:
+    try:
+        if dep[0] == "sources":
+            return sources_dependency(dep[1]) == dep
+        if dep[0] == "sheet":
+            return dep[3] is not None and cached_snapshot_version(dep[1], dep[2]) == dep[3]
+        if dep[0] == "roll-absent":
+            memberships = roll_memberships(dep[1])
+            return all(version is not None and indexed_version(sid, rng) == version and (sid, rng) not in memberships
+                       for sid, rng, version in dep[2])
+    except Exception as e:
+        print(f"ETag dependency check failed for {dep[:2]}: {e}")
+    return False
+
+def issue_etag(key, dependencies) -> str:
+    """Create (and remember) the ETag for a response built from these dependencies"""
+    etag = 'W/"' + hashlib.sha1(dumps_json([key, dependencies])).hexdigest()[:24] + '"'
+    with _etag_lock:
+        _etag_registry[etag] = (key, dependencies)
+        _etag_registry.move_to_end(etag)
+        while len(_etag_registry) > ETAG_REGISTRY_SIZE:
+            _etag_registry.popitem(last=False)
+    return etag
+
+def check_not_modified(request: Request, key) -> Optional[Response]:
+    """Return a 304 response if the client's If-None-Match is still current for key"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    for tag in header.split(","):
+        tag = tag.strip()
+        if not tag.startswith("W/"):
+            tag = "W/" + tag
+        with _etag_lock:
+            entry = _etag_registry.get(tag)
+        if entry and entry[0] == key and all(_dependency_is_current(dep) for dep in entry[1]):
+            return Response(status_code=304, headers={"ETag": tag, "Cache-Control": CONDITIONAL_CACHE_CONTROL})
+    return None
+
 # Google Sheets User DB Helpers
-def get_sheet_users(env_var_name="STUDENT_SHEET_ID"):
+USERS_RANGE = "Sheet1!A:E"
+SOURCES_RANGE = "Sources!A:D"
+
+def _user_from_row(row):
+    return {
+        "role": row[0],
+        "rollNumber": row[1],
+        "name": row[2],
+        "email": row[3],
+        "password": row[4]
+    }
+
+def get_sheet_users(env_var_name="STUDENT_SHEET_ID", max_age: Optional[float] = None):
+    """
+    In-memory user directory for a users sheet, reloaded every USERS_TTL_SECONDS.
+    Includes registrations still waiting in the write-behind queue.
+    """
     sheet_id = os.getenv(env_var_name)
     if not sheet_id or not sheets_service:
         return []
+    ttl = USERS_TTL_SECONDS if max_age is None else max_age
+    cached = _user_directory.get(env_var_name)
+    if cached and cached["sheetId"] == sheet_id and time.time() - cached["fetchedAt"] < ttl:
+        return cached["users"]
     try:
+        load_started = time.time()
         # Default to Sheet1 since these are dedicated files
         result = sheets_service.spreadsheets().values().get(
             spreadsheetId=sheet_id,
-            range="Sheet1!A:E"
+            range=USERS_RANGE
         ).execute()
         rows = result.get('values', [])
 
-        users = []
+        directory = {"sheetId": sheet_id, "users": [], "byRoll": {}, "fetchedAt": 0.0}
+        seen = set()
         for row in rows[1:]: # Skip header
             if len(row) >= 5:
-                users.append({
-                    "role": row[0],
-                    "rollNumber": row[1],
-                    "name": row[2],
-                    "email": row[3],
-                    "password": row[4]
-                })
-        return users
+                _directory_add(directory, row)
+                seen.add(tuple(row[:5]))
+
+        # Queued rows this sheet read may not include yet
+        for row in pending_sheet_rows(sheet_id, USERS_RANGE, since=load_started):
+            if len(row) >= 5 and tuple(row[:5]) not in seen:
+                _directory_add(directory, row)
+
+        directory["fetchedAt"] = time.time()
+        _user_directory[env_var_name] = directory
+        return directory["users"]
     except Exception as e:
         print(f"Sheet Auth Error ({env_var_name}): {e}")
-        return []
+        # Serve the last good directory rather than locking everyone out
+        return cached["users"] if cached else []
+
+def _directory_add(directory, row):
+    user = _user_from_row(row)
+    directory["users"].append(user)
+    # Roll number index (first registration wins, like a linear scan would)
+    directory["byRoll"].setdefault(user["rollNumber"].strip().lower(), user)
+
+def get_user_roll_index(env_var_name="STUDENT_SHEET_ID"):
+    """Normalized roll number -> user, from the in-memory directory"""
+    get_sheet_users(env_var_name)
+    cached = _user_directory.get(env_var_name)
+    return cached["byRoll"] if cached else {}
+
+def find_sheet_user(env_var_name, match):
+    """First user matching match(user); a miss re-reads a directory older than USERS_MISS_RELOAD_SECONDS"""
+    user = next((u for u in get_sheet_users(env_var_name) if match(u)), None)
+    if user is None:
+        user = next((u for u in get_sheet_users(env_var_name, max_age=USERS_MISS_RELOAD_SECONDS) if match(u)), None)
+    return user
 
 def append_user_to_sheet(env_var_name, role, roll, name, email, hashed_password):
+    return append_users_to_sheet(env_var_name, [[role, roll, name, email, hashed_password]])
+
+def append_users_to_sheet(env_var_name, rows):
+    """Append [role, roll, name, email, hashed_password] rows in a single write"""
     sheet_id = os.getenv(env_var_name)
     if not sheet_id or not sheets_service:
         return False, f"Missing Sheet ID ({env_var_name}) or Service not initialized"
     try:
-        body = {"values": [[role, roll, name, email, hashed_password]]}
-        sheets_service.spreadsheets().values().append(
-            spreadsheetId=sheet_id,
-            range="Sheet1!A:E",
-            valueInputOption="RAW",
-            body=body
-        ).execute()
+        if WRITE_BEHIND_ENABLED:
+            enqueue_sheet_appends(sheet_id, USERS_RANGE, rows)
+        else:
+            body = {"values": rows}
+            sheets_service.spreadsheets().values().append(
+                spreadsheetId=sheet_id,
+                range=USERS_RANGE,
+                valueInputOption="RAW",
+                body=body
+            ).execute()
+        # Visible to logins on this worker right away
+        cached = _user_directory.get(env_var_name)
+        if cached and cached["sheetId"] == sheet_id:
+            for row in rows:
+                _directory_add(cached, row)
         return True, "Success"
     except Exception as e:
         error_msg = str(e)
         print(f"Sheet Append Error ({env_var_name}): {error_msg}")
         return False, f"Google Sheet Error: {error_msg}"
 
+# Write-behind queue
+# Appends are journaled to SQLite and sent by a background thread every
+# WRITE_BEHIND_INTERVAL_SECONDS as one batched append per target range.
+# Failed batches retry with exponential backoff. Sent rows are kept for
+# WRITE_BEHIND_RETENTION_SECONDS so readers whose cached sheet copy predates
+# the send still see them.
+_write_behind_stop = threading.Event()
+_write_behind_thread = None
+_write_behind_flush_lock = threading.Lock()
+
+def enqueue_sheet_append(spreadsheet_id: str, range_name: str, row: List[Any]):
+    enqueue_sheet_appends(spreadsheet_id, range_name, [row])
+
+def enqueue_sheet_appends(spreadsheet_id: str, range_name: str, rows: List[List[Any]]):
+    conn = get_db()
+    try:
+        conn.executemany(
+            "INSERT INTO pending_sheet_appends (spreadsheet_id, range, row_json) VALUES (?, ?, ?)",
+            [(spreadsheet_id, range_name, json.dumps(row)) for row in rows]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def pending_sheet_rows(spreadsheet_id: str, range_name: str, since: float = 0.0):
+    """Queued rows for a range: unsent ones plus those sent after `since`"""
+    try:
+        conn = get_db()
+        try:
+            rows = conn.execute(
+                """SELECT row_json FROM pending_sheet_appends
+                   WHERE spreadsheet_id = ? AND range = ? AND (flushed_at IS NULL OR flushed_at > ?)
+                   ORDER BY id""",
+                (spreadsheet_id, range_name, since)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [json.loads(r['row_json']) for r in rows]
+    except sqlite3.Error as e:
+        print(f"Write-behind journal read failed: {e}")
+        return []
+
+def _unsent_appends(spreadsheet_id: str, range_name: str, match, include_sent: bool = False):
+    conn = get_db()
+    try:
+        rows = conn.execute(
+            "SELECT id, row_json FROM pending_sheet_appends WHERE spreadsheet_id = ? AND range = ?"
+            + ("" if include_sent else " AND flushed_at IS NULL"),
+            (spreadsheet_id, range_name)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [(r['id'], json.loads(r['row_json'])) for r in rows if match(json.loads(r['row_json']))]
+
+def cancel_pending_appends(spreadsheet_id: str, range_name: str, match, include_sent: bool = False) -> int:
+    """
+    Drop unsent rows matching match(row). include_sent also forgets rows already
+    sent, so they are no longer merged into reads (after the sheet row is edited).
+    """
+    ids = [row_id for row_id, _ in _unsent_appends(spreadsheet_id, range_name, match, include_sent)]
+    if ids:
+        conn = get_db()
+        try:
+            conn.executemany("DELETE FROM pending_sheet_appends WHERE id = ?", [(i,) for i in ids])
+            conn.commit()
+        finally:
+            conn.close()
+    return len(ids)
+
+def replace_pending_append(spreadsheet_id: str, range_name: str, match, new_row) -> bool:
+    """Rewrite the first unsent row matching match(row)"""
+    found = _unsent_appends(spreadsheet_id, range_name, match)
+    if not found:
+        return False
+    conn = get_db()
+    try:
+        conn.execute(
+            "UPDATE pending_sheet_appends SET row_json = ? WHERE id = ? AND flushed_at IS NULL",
+            (json.dumps(new_row), found[0][0])
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return True
+
+def flush_write_behind() -> int:
+    """Send every due queued append, batched per target range. Returns rows sent."""
+    if not sheets_service:
+        return 0
+    with _write_behind_flush_lock:
+        now = time.time()
+        conn = get_db()
+        try:
+            # Claim due rows so other workers sharing the journal skip them
+            conn.execute("BEGIN IMMEDIATE")
+            due = conn.execute(
+                """SELECT id, spreadsheet_id, range, row_json, attempts FROM pending_sheet_appends
+                   WHERE flushed_at IS NULL AND next_attempt_at <= ? ORDER BY id LIMIT ?""",
+                (now, WRITE_BEHIND_BATCH_LIMIT)
+            ).fetchall()
+            if due:
+                conn.executemany(
+                    "UPDATE pending_sheet_appends SET next_attempt_at = ? WHERE id = ?",
+                    [(now + WRITE_BEHIND_MAX_BACKOFF_SECONDS, r['id']) for r in due]
+                )
+            conn.execute(
+                "DELETE FROM pending_sheet_appends WHERE flushed_at IS NOT NULL AND flushed_at < ?",
+                (now - WRITE_BEHIND_RETENTION_SECONDS,)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            conn.close()
+            raise
+
+        groups = OrderedDict()
+        for r in due:
+            groups.setdefault((r['spreadsheet_id'], r['range']), []).append(r)
+
+        sent = 0
+        for (spreadsheet_id, range_name), items in groups.items():
+            ids = [r['id'] for r in items]
+            try:
+                sheets_service.spreadsheets().values().append(
+                    spreadsheetId=spreadsheet_id,
+                    range=range_name,
+                    valueInputOption="RAW",
+                    body={"values": [json.loads(r['row_json']) for r in items]}
+                ).execute()
+                conn.executemany(
+                    "UPDATE pending_sheet_appends SET flushed_at = ?, last_error = NULL WHERE id = ?",
+                    [(time.time(), i) for i in ids]
+                )
+                conn.commit()
+                sent += len(items)
+                if range_name == SOURCES_RANGE:
+                    invalidate_sources_cache()
+            except Exception as e:
+                attempts = max(r['attempts'] for r in items) + 1
+                backoff = min(WRITE_BEHIND_INTERVAL_SECONDS * (2 ** attempts), WRITE_BEHIND_MAX_BACKOFF_SECONDS)
+                conn.executemany(
+                    "UPDATE pending_sheet_appends SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    [(time.time() + backoff, str(e)[:500], i) for i in ids]
+                )
+                conn.commit()
+                print(f"⚠ Write-behind append of {len(items)} rows to {range_name} failed (retry in {backoff:.1f}s): {e}")
+        conn.close()
+        if sent:
+            print(f"✓ Write-behind: sent {sent} queued rows in {len(groups)} batch(es)")
+        return sent
+
+def _write_behind_loop():
+    while not _write_behind_stop.wait(WRITE_BEHIND_INTERVAL_SECONDS):
+        try:
+            flush_write_behind()
+        except Exception as e:
+            print(f"❌ Write-behind flush error: {e}")
+
+def start_write_behind():
+    global _write_behind_thread
+    if not WRITE_BEHIND_ENABLED or _write_behind_thread is not None:
+        return
+    _write_behind_stop.clear()
+    _write_behind_thread = threading.Thread(target=_write_behind_loop, name="sheets-write-behind", daemon=True)
+    _write_behind_thread.start()
+    print(f"✓ Write-behind queue running (every {WRITE_BEHIND_INTERVAL_SECONDS:g}s)")
+
+def stop_write_behind():
+    """Stop the flusher and make a last attempt to send what is queued"""
+    global _write_behind_thread
+    if _write_behind_thread is None:
+        return
+    _write_behind_stop.set()
+    _write_behind_thread.join(timeout=10)
+    _write_behind_thread = None
+    try:
+        flush_write_behind()
+    except Exception as e:
+        print(f"❌ Final write-behind flush failed (rows stay journaled): {e}")
+
 def get_sheet_sources(owner_email=None):
     """Fetch list of Marking Sheets from the Admin Config Sheet"""
     sheet_id = os.getenv("ADMIN_SHEET_ID")
@@ -448,16 +2046,19 @@ def get_sheet_sources(owner_email=None):
         return []
     try:
         # Format: SheetID | Range | Name | OwnerEmail
-        result = sheets_service.spreadsheets().values().get(
-            spreadsheetId=sheet_id,
-            range="Sources!A:D"
-        ).execute()
-        rows = result.get('values', [])
+        rows = _get_sources_rows(sheet_id)
         print(f"Got {len(rows)} rows from Sources tab")
 
+        # Plus sources still in the write-behind queue (or sent after the tab was read)
+        known = {tuple(r) for r in rows}
+        pending = [r for r in pending_sheet_rows(sheet_id, SOURCES_RANGE, since=_sources_cache["loadStartedAt"]) if tuple(r) not in known]
+        if pending:
+            rows = rows + pending
+
         # Get first admin email for legacy sources (backward compatibility)
-        first_admin_email = None
-        if owner_email:
+        # Cached alongside the Sources rows since it only changes with them
+        first_admin_email = _sources_cache["firstAdmin"]
+        if owner_email and not _sources_cache["firstAdminLoaded"]:
             try:
                 sheet_admins = get_sheet_users("ADMIN_SHEET_ID")
                 if sheet_admins:
@@ -478,6 +2079,7 @@ def get_sheet_sources(owner_email=None):
                     except Exception as sqle:
                         print(f"SQLite fallback failed: {sqle}")
 
+                _sources_cache.update(firstAdmin=first_admin_email, firstAdminLoaded=True)
             except Exception as e:
                 print(f"Could not determine first admin: {e}")
 
@@ -531,10 +2133,14 @@ def append_source_to_sheet(target_sheet_id, target_range, sheet_name="", owner_e
         return False, "ADMIN_SHEET_ID not configured or Sheets service not initialized"
     try:
         # Append with Owner Email in Column D
-        body = {"values": [[target_sheet_id, target_range, sheet_name, owner_email]]}
+        row = [target_sheet_id, target_range, sheet_name, owner_email]
+        if WRITE_BEHIND_ENABLED:
+            enqueue_sheet_append(config_sheet_id, SOURCES_RANGE, row)
+            return True, "Success"
+        body = {"values": [row]}
         sheets_service.spreadsheets().values().append(
             spreadsheetId=config_sheet_id,
-            range="Sources!A:D",
+            range=SOURCES_RANGE,
             valueInputOption="RAW",
             body=body
         ).execute()
@@ -544,24 +2150,72 @@ def append_source_to_sheet(target_sheet_id, target_range, sheet_name="", owner_e
         print(f"Source Config Write Error: {error_msg}")
         return False, f"Failed to write to Sources tab: {error_msg}"
 
-import bcrypt
-
 def verify_password(plain_password, hashed_password):
+    import bcrypt
     try:
         return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
     except:
         return False
 
 def get_password_hash(password):
+    import bcrypt
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
+# Password hashing pool for bulk imports. bcrypt is CPU-bound, so hashes are
+# spread over worker processes; where process pools are unavailable (e.g.
+# serverless sandboxes without shared memory) threads are used instead, which
+# still run in parallel because bcrypt releases the GIL.
+_hash_executor = None
+
+def _hash_passwords(passwords):
+    return [get_password_hash(p) for p in passwords]
+
+def get_hash_executor():
+    global _hash_executor
+    if _hash_executor is None:
+        try:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            _hash_executor = ProcessPoolExecutor(
+                max_workers=BULK_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        except (ImportError, OSError, NotImplementedError) as e:
+            from concurrent.futures import ThreadPoolExecutor
+            print(f"⚠ Process pool unavailable ({e}), hashing with threads")
+            _hash_executor = ThreadPoolExecutor(max_workers=BULK_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _hash_executor
+
+async def hash_passwords_parallel(passwords: List[str]) -> List[str]:
+    import asyncio
+    if not passwords:
+        return []
+    loop = asyncio.get_running_loop()
+    executor = get_hash_executor()
+    chunk = max(1, -(-len(passwords) // (BULK_HASH_WORKERS * 4)))
+    chunks = [passwords[i:i + chunk] for i in range(0, len(passwords), chunk)]
+    results = await asyncio.gather(*(loop.run_in_executor(executor, _hash_passwords, c) for c in chunks))
+    return [h for part in results for h in part]
+
+def shutdown_hash_executor():
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
     to_encode.update({"exp": expire})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_access_token(token: str) -> dict:
+    """Decode and verify a JWT (raises JWTError)"""
+    from jose import jwt
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
 # API Routes
 
 @app.get("/api/debug/config")
@@ -612,9 +2266,34 @@ async def health_check():
         "database": "SQLite3",
         "sheetsConnected": sheets_service is not None,
         "initError": sheet_init_error,
-        "cachedStudents": len(student_cache)
+        "cachedStudents": len(student_cache),
+        "warmup": _warmup["status"],
+        "admission": {name: route_class.stats() for name, route_class in admission_classes.items()}
     }
 
+@app.get("/api/ready")
+async def readiness_check():
+    """Warm/cold state of every source; 503 until the startup warmup has finished
+    or when every source failed to load"""
+    with _warmup_lock:
+        sources = [dict(entry) for entry in _warmup["sources"].values()]
+    warmup_status = _warmup["status"]
+    if warmup_status == "done" and sources and all(entry["state"] == "error" for entry in sources):
+        warmup_status = "failed"
+    elif warmup_status == "done" and any(entry["state"] == "error" for entry in sources):
+        warmup_status = "degraded"
+    ready = warmup_status in ("done", "degraded")
+    return json_response({
+        "success": True,
+        "ready": ready,
+        "warmup": warmup_status,
+        "startedAt": _warmup["startedAt"],
+        "finishedAt": _warmup["finishedAt"],
+        "warmSources": sum(1 for entry in sources if entry["state"] == "warm"),
+        "totalSources": len(sources),
+        "sources": sources
+    }, status_code=200 if ready else 503)
+
 
 
 @app.get("/google868b6519e7f03d83.html")
@@ -635,8 +2314,7 @@ async def register_student(student: StudentRegister):
 
     # 1. OPTION A: Google Sheets DB (Permanent & Editable)
     # Check duplicates in sheet
-    sheet_users = get_sheet_users("STUDENT_SHEET_ID")
-    if any(u['rollNumber'] == student.rollNumber for u in sheet_users):
+    if find_sheet_user("STUDENT_SHEET_ID", lambda u: u['rollNumber'] == student.rollNumber):
         raise HTTPException(status_code=400, detail="Student already registered (in Sheet)")
 
     success, msg = append_user_to_sheet("STUDENT_SHEET_ID", 'student', student.rollNumber, student.name, "", hashed_password)
@@ -667,13 +2345,11 @@ async def register_student(student: StudentRegister):
 
 @app.post("/api/login")
 async def login_student(credentials: StudentLogin):
-    # 1. OPTION A: Google Sheet DB
-    sheet_users = get_sheet_users("STUDENT_SHEET_ID")
-    
+    # 1. OPTION A: Google Sheet DB (in-memory directory)
     # Robust matching (Case insensitive, ignore whitespace - Fix for Mobile)
     input_roll = credentials.rollNumber.strip().lower()
 
-    user = next((u for u in sheet_users if u['rollNumber'].strip().lower() == input_roll), None)
+    user = find_sheet_user("STUDENT_SHEET_ID", lambda u: u['rollNumber'].strip().lower() == input_roll)
 
     if user:
         if verify_password(credentials.password, user['password']):
@@ -689,14 +2365,7 @@ async def login_student(credentials: StudentLogin):
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
     # 2. OPTION B: SQLite Fallback
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM students WHERE roll_number = ?",
-        (credentials.rollNumber,)
-    )
-    student = cursor.fetchone()
-    conn.close()
+    student = await run_db(db_fetchone, "SELECT * FROM students WHERE roll_number = ?", (credentials.rollNumber,))
 
     if not student or not verify_password(credentials.password, student['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -723,147 +2392,210 @@ async def test_endpoint():
         "sheets_service": "initialized" if sheets_service else "not initialized"
     }
 
-@app.get("/api/marks/{roll_number:path}")
-async def get_marks(roll_number: str, authorization: Optional[str] = Header(None)):
+# Marks lookup across sheets
+# Candidate sheets are the sources the roll index does not rule out, those known
+# to list the student first. In race mode they are all requested at once on the
+# lookup pool and the first sheet that lists the student answers; requests not
+# yet started are cancelled and the results of running ones are discarded
+# (their downloads still refresh the snapshot cache). Each sheet request is
+# hedged: if it is still running after the MARKS_HEDGE_PERCENTILE of recent
+# download times, a second direct download is started and the first of the
+# two to succeed is used.
+_lookup_executor = None
+
+def get_lookup_executor():
+    global _lookup_executor
+    if _lookup_executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _lookup_executor = ThreadPoolExecutor(max_workers=MARKS_LOOKUP_WORKERS, thread_name_prefix="marks-lookup")
+    return _lookup_executor
+
+def shutdown_lookup_executor():
+    global _lookup_executor
+    if _lookup_executor is not None:
+        _lookup_executor.shutdown(wait=False, cancel_futures=True)
+        _lookup_executor = None
+
+def hedge_delay() -> Optional[float]:
+    """Seconds after which a sheet request is duplicated (None = no hedging yet)"""
+    if MARKS_HEDGE_PERCENTILE <= 0 or len(_fetch_latencies) < MARKS_HEDGE_MIN_SAMPLES:
+        return None
+    samples = sorted(_fetch_latencies)
+    return samples[min(len(samples) - 1, int(len(samples) * MARKS_HEDGE_PERCENTILE / 100))]
+
+def _sheet_lookup(roll_number: str, sheet_id: str, range_val: str, hedge: bool = False):
+    """(snapshot, graded table, the student's row or None) for one sheet; runs on the lookup pool"""
+    snapshot = _download_snapshot(sheet_id, range_val) if hedge else get_sheet_snapshot(sheet_id, range_val)
+    table = get_graded_table(snapshot)
+    # Looked up in this snapshot itself: the shared roll index may already hold another version
+    return snapshot, table, get_sheet_schema(snapshot).find_row(snapshot, roll_number)
+
+async def _hedged_sheet_lookup(roll_number: str, sheet_id: str, range_val: str):
+    import asyncio
+    loop = asyncio.get_running_loop()
+    executor = get_lookup_executor()
+    requests = [loop.run_in_executor(executor, _sheet_lookup, roll_number, sheet_id, range_val)]
     try:
-        if not sheets_service:
-             raise HTTPException(status_code=500, detail="Google Sheets service not initialized")
+        delay = hedge_delay()
+        if delay is not None:
+            done, _ = await asyncio.wait(requests, timeout=delay)
+            if not done:
+                requests.append(loop.run_in_executor(executor, _sheet_lookup, roll_number, sheet_id, range_val, True))
+        pending = set(requests)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for request in done:
+                if request.exception() is None or not pending:
+                    return request.result()
+    finally:
+        for request in requests:
+            if not request.done():
+                request.cancel()
 
-        # Determine if Admin is searching (Filter sources)
-        owner_email = None
-        if authorization:
-            try:
-                scheme, _, param = authorization.partition(" ")
-                if scheme.lower() == 'bearer':
+async def find_student_marks(roll_number: str, sources, dependencies: list, sheet_errors: list):
+    """
+    (sheet_name, snapshot, table, row) of a sheet that lists the student, or None.
+    Snapshot versions of the sheets read go into dependencies, read errors into sheet_errors.
+    """
+    import asyncio
+    memberships = roll_memberships(roll_number)
+    candidates = []
+    skipped = []
+    for source in sources:
+        if len(source) == 3:
+            sheet_id, range_val, name = source
+        else:
+            sheet_id, range_val = source
+            name = "Unknown"
+        if (sheet_id, range_val) not in memberships and indexed_version(sheet_id, range_val):
+            skipped.append((sheet_id, range_val))
+        else:
+            candidates.append((sheet_id, range_val, name))
+    dependencies.append(roll_absence_dependency(roll_number, skipped))
+
+    race = MARKS_LOOKUP_MODE == "race"
+    if race:
+        # Sheets the index says list the student first (stable, so source order otherwise)
+        candidates.sort(key=lambda c: (c[0], c[1]) not in memberships)
+
+    def settle(candidate, request):
+        """Record one finished sheet request; the match if the student is on it"""
+        sheet_id, range_val, name = candidate
+        try:
+            snapshot, table, row = request.result()
+        except Exception as e:
+            print(f"Error reading sheet {name}: {e}")
+            dependencies.append(sheet_dependency(sheet_id, range_val, None))
+            # Store friendly error
+            err_str = str(e)
+            if "403" in err_str: sheet_errors.append(f"{name}: Permission Denied (Share sheet with service email)")
+            elif "404" in err_str: sheet_errors.append(f"{name}: Sheet Not Found")
+            elif "Unable to parsing" in err_str: sheet_errors.append(f"{name}: Tab/Range Error")
+            else: sheet_errors.append(f"{name}: {err_str}")
+            return None
+        dependencies.append(sheet_dependency(sheet_id, range_val, snapshot["version"]))
+        return (name, snapshot, table, row) if row is not None else None
+
+    if not race:
+        for candidate in candidates:
+            request = asyncio.ensure_future(_hedged_sheet_lookup(roll_number, *candidate[:2]))
+            await asyncio.wait([request])
+            found = settle(candidate, request)
+            if found:
+                return found
+        return None
+
+    requests = {asyncio.ensure_future(_hedged_sheet_lookup(roll_number, *candidate[:2])): position
+                for position, candidate in enumerate(candidates)}
+    pending = set(requests)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            matches = [settle(candidates[requests[request]], request)
+                       for request in sorted(done, key=requests.get)]
+            matches = [match for match in matches if match]
+            if matches:
+                return matches[0]
+        return None
+    finally:
+        for request in pending:
+            request.cancel()
+
+@app.get("/api/marks/{roll_number:path}")
+async def get_marks(roll_number: str, request: Request, response: Response, authorization: Optional[str] = Header(None)):
+    try:
+        if not sheets_service:
+             raise HTTPException(status_code=500, detail="Google Sheets service not initialized")
+
+        # Determine if Admin is searching (Filter sources)
+        owner_email = None
+        if authorization:
+            try:
+                scheme, _, param = authorization.partition(" ")
+                if scheme.lower() == 'bearer':
                     # Avoid decoding 'null' string
                     if param and param != 'null':
-                        payload = jwt.decode(param, SECRET_KEY, algorithms=[ALGORITHM])
+                        payload = decode_access_token(param)
                         if "id" in payload: 
                             owner_email = payload.get("email")
                             print(f"Admin Search: Filtering sources for {owner_email}")
             except Exception as e:
                 print(f"Token parsing failed in search: {e}")
                 
+        etag_key = ("marks", roll_number.strip().lower(), owner_email)
+        not_modified = check_not_modified(request, etag_key)
+        if not_modified:
+            return not_modified
+
         # Get sources (Filtered if admin, All if student/public)
         sources = get_sheet_sources(owner_email)
         sheet_errors = []
-
-        # Search each sheet directly
-        for source in sources:
-            if len(source) == 3:
-                sheet_id, range_val, name = source
-            else:
-                sheet_id, range_val = source
-                name = "Unknown"
-
-            try:
-                # First, get the header row to know column names
-                # Determine Header Row dynamically based on Data Range
-                # Logic: If data starts at A3, Header is at Row 2.
-                header_row = 1
-                sheet_part = "Sheet1"
-                
-                if "!" in range_val:
-                    parts = range_val.split("!")
-                    sheet_part = parts[0]
-                    range_part = parts[1]
-                else:
-                    range_part = range_val
-
-                # Find start row number in range (e.g. A3:Z -> 3)
-                import re
-                match = re.search(r'([0-9]+)', range_part)
-                if match:
-                    data_start_row = int(match.group(1))
-                    if data_start_row > 1:
-                        header_row = data_start_row - 1
-                
-                header_range = f"{sheet_part}!{header_row}:{header_row}"
-                
-                header_result = sheets_service.spreadsheets().values().get(
-                    spreadsheetId=sheet_id,
-                    range=header_range
-                ).execute()
-                header_rows = header_result.get('values', [])
-                headers = header_rows[0][2:] if header_rows and len(header_rows[0]) > 2 else []
-
-                # Now get the data rows
-                result = sheets_service.spreadsheets().values().get(
-                    spreadsheetId=sheet_id,
-                    range=range_val
-                ).execute()
-                rows = result.get('values', [])
-                
-                # Loop through all rows to calculate class stats AND find student
-                sheet_totals = []
-                found_student_payload = None
-                
-                for row in rows:
-                    if row and len(row) >= 2:
-                        # 1. Calculate Total for this row (for Class Average)
-                        current_row_total = 0
-                        current_raw_marks = row[2:]
-                        for i, m in enumerate(current_raw_marks):
-                            if i < len(headers):
-                                label = headers[i]
-                                if label.lower() != 'total':
-                                    try:
-                                        mark_value = float(m.replace('%','').strip()) if m else 0
-                                        current_row_total += mark_value
-                                    except: 
-                                        pass
-                        
-                        sheet_totals.append(current_row_total)
-
-                        # 2. Check if this is the student
-                        row_roll = row[0].strip()
-                        if row_roll.lower() == roll_number.lower():
-                            student_name = row[1].strip()
-                            
-                            # Build marks objects
-                            marks_dict = {"rollNumber": row_roll, "name": student_name, "Total": current_row_total}
-                            marks_array = []
-                            
-                            for i, mark in enumerate(current_raw_marks):
-                                if i < len(headers):
-                                    label = headers[i]
-                                    value = mark if mark else '-'
-                                    marks_dict[label] = value
-                                    marks_array.append({"label": label, "value": value})
-                            
-                            found_student_payload = {
-                                "success": True,
-                                "marks": marks_dict,
-                                "student": {
-                                    "rollNumber": row_roll,
-                                    "name": student_name,
-                                    "sheetName": name,
-                                    "marks": marks_array,
-                                    "total": current_row_total
-                                }
-                            }
-                
-                if found_student_payload:
-                    # Calculate Class Average
-                    class_avg = sum(sheet_totals) / len(sheet_totals) if sheet_totals else 0
-                    found_student_payload["classAverage"] = round(class_avg, 2)
-                    found_student_payload["student"]["classAverage"] = round(class_avg, 2)
-                    return found_student_payload
-            except Exception as e:
-                print(f"Error reading sheet {name}: {e}")
-                # Store friendly error
-                err_str = str(e)
-                if "403" in err_str: sheet_errors.append(f"{name}: Permission Denied (Share sheet with service email)")
-                elif "404" in err_str: sheet_errors.append(f"{name}: Sheet Not Found")
-                elif "Unable to parsing" in err_str: sheet_errors.append(f"{name}: Tab/Range Error")
-                else: sheet_errors.append(f"{name}: {err_str}")
-                continue
+        # Sheets read: the answer depends on the student being absent from the ones without a match
+        dependencies = [sources_dependency(owner_email)]
+        missing_key = ("marks", normalize_roll(roll_number), dependencies[0])
+        missing_detail = missing_roll_detail(missing_key)
+        if missing_detail:
+            raise HTTPException(status_code=404, detail=missing_detail)
+
+        found = await find_student_marks(roll_number, sources, dependencies, sheet_errors)
+        if found:
+            name, snapshot, table, row = found
+            headers = snapshot["headers"]
+            record = StudentRecord(row, intern_headers(headers))
+
+            # Build marks objects
+            marks_dict = {"rollNumber": record.rollNumber, "name": record.name, "Total": record.total}
+            marks_array = []
+
+            for i, mark in enumerate(row[2:2 + len(headers)]):
+                label = headers[i]
+                value = mark if mark else '-'
+                marks_dict[label] = value
+                marks_array.append({"label": label, "value": value})
+
+            class_avg = round(table["classAverage"], 2)
+            response.headers["ETag"] = issue_etag(etag_key, dependencies)
+            response.headers["Cache-Control"] = CONDITIONAL_CACHE_CONTROL
+            return {
+                "success": True,
+                "marks": marks_dict,
+                "student": {
+                    "rollNumber": record.rollNumber,
+                    "name": record.name,
+                    "sheetName": name,
+                    "marks": marks_array,
+                    "total": record.total,
+                    "classAverage": class_avg
+                },
+                "classAverage": class_avg
+            }
 
         # If we get here, student not found
         error_detail = f"Student marks not found for: {roll_number}"
         if sheet_errors:
             error_detail += f". WARNING: Failed to read sheets: {'; '.join(sheet_errors)}"
-            
+        else:
+            remember_missing_roll(missing_key, error_detail)
         raise HTTPException(status_code=404, detail=error_detail)
 
     except HTTPException:
@@ -873,8 +2605,95 @@ async def get_marks(roll_number: str, authorization: Optional[str] = Header(None
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
+def _sheet_error_message(name: str, error: Exception) -> str:
+    err_str = str(error)
+    if "403" in err_str:
+        return f"{name}: Permission Denied"
+    if "404" in err_str:
+        return f"{name}: Not Found"
+    return f"{name}: {err_str[:50]}"
+
+def locate_student(roll_number: str, sources, dependencies: list, sheet_errors: list):
+    """
+    Yield (sheet_id, sheet_name, snapshot, table, row) for every sheet that lists
+    the student (the last matching row if listed twice). Sheets the roll index
+    knows the student is not on are skipped without reading them.
+    Snapshot versions go into dependencies; unreadable sheets into sheet_errors.
+    """
+    memberships = roll_memberships(roll_number)
+    skipped = []
+    for source in sources:
+        if len(source) == 3:
+            sheet_id, range_val, name = source
+        else:
+            sheet_id, range_val = source
+            name = "Unknown"
+
+        if (sheet_id, range_val) not in memberships and indexed_version(sheet_id, range_val):
+            skipped.append((sheet_id, range_val))
+            continue
+
+        try:
+            try:
+                snapshot = get_sheet_snapshot(sheet_id, range_val)
+            except Exception:
+                dependencies.append(sheet_dependency(sheet_id, range_val, None))
+                raise
+            dependencies.append(sheet_dependency(sheet_id, range_val, snapshot["version"]))
+            table = get_graded_table(snapshot)
+        except Exception as e:
+            print(f"Error reading sheet {name}: {e}")
+            sheet_errors.append(_sheet_error_message(name, e))
+            continue
+
+        # Looked up in this snapshot itself: the shared roll index may already hold another version
+        row = get_sheet_schema(snapshot).find_row(snapshot, roll_number)
+        if row is not None:
+            yield sheet_id, name, snapshot, table, row
+    dependencies.append(roll_absence_dependency(roll_number, skipped))
+
+# Standing within a sheet: binary search over the snapshot's sorted totals
+def rank_of(sorted_totals, score) -> int:
+    """Competition rank (1 = highest; equal scores share the best rank, e.g. 1, 2, 2, 4)"""
+    import bisect
+    return len(sorted_totals) - bisect.bisect_right(sorted_totals, score) + 1
+
+def score_standing(sorted_totals, score, bands: int = 2) -> Dict[str, Any]:
+    """Rank, percentile and the nearest distinct scores above and below"""
+    import bisect
+    n = len(sorted_totals)
+    low = bisect.bisect_left(sorted_totals, score)
+    high = bisect.bisect_right(sorted_totals, score)
+    rank = n - high + 1
+
+    def band(lo, hi):
+        return {"score": sorted_totals[lo], "students": hi - lo, "rank": n - hi + 1}
+
+    above = []
+    pos = high
+    while pos < n and len(above) < bands:
+        end = bisect.bisect_right(sorted_totals, sorted_totals[pos], pos)
+        above.append(band(pos, end))
+        pos = end
+    below = []
+    pos = low
+    while pos > 0 and len(below) < bands:
+        start = bisect.bisect_left(sorted_totals, sorted_totals[pos - 1], 0, pos)
+        below.append(band(start, pos))
+        pos = start
+
+    return {
+        "rank": rank,
+        "totalStudents": n,
+        # Share of the class ranked below the student (as used by relative grading)
+        "percentile": round((n - rank) / n * 100, 2) if n else 0,
+        "tiedWith": max(high - low - 1, 0),
+        "above": above,
+        "below": below
+    }
+
 @app.get("/api/student/subjects/{roll_number:path}")
-async def get_student_subjects(roll_number: str):
+async def get_student_subjects(roll_number: str, request: Request, response: Response):
     """
     Get all subjects (sheets) where a student has marks.
     Also calculates Class Average and Student Rank.
@@ -883,147 +2702,114 @@ async def get_student_subjects(roll_number: str):
         if not sheets_service:
             raise HTTPException(status_code=500, detail="Google Sheets service not initialized")
 
+        etag_key = ("subjects", roll_number.strip().lower())
+        not_modified = check_not_modified(request, etag_key)
+        if not_modified:
+            return not_modified
+
         # Get all configured sources (from all teachers)
         sources = get_sheet_sources()
         student_subjects = []
         sheet_errors = []
-
-        # Search each sheet for this student
-        for source in sources:
-            if len(source) == 3:
-                sheet_id, range_val, name = source
-            else:
-                sheet_id, range_val = source
-                name = "Unknown"
-
-            try:
-                # Get header row
-                header_row = 1
-                sheet_part = "Sheet1"
-                
-                if "!" in range_val:
-                    parts = range_val.split("!")
-                    sheet_part = parts[0]
-                    range_part = parts[1]
-                else:
-                    range_part = range_val
-
-                # Find start row number
-                import re
-                match = re.search(r'([0-9]+)', range_part)
-                if match:
-                    data_start_row = int(match.group(1))
-                    if data_start_row > 1:
-                        header_row = data_start_row - 1
-                
-                header_range = f"{sheet_part}!{header_row}:{header_row}"
-                
-                header_result = sheets_service.spreadsheets().values().get(
-                    spreadsheetId=sheet_id,
-                    range=header_range
-                ).execute()
-                header_rows = header_result.get('values', [])
-                headers = header_rows[0][2:] if header_rows and len(header_rows[0]) > 2 else []
-
-                # Get data rows
-                result = sheets_service.spreadsheets().values().get(
-                    spreadsheetId=sheet_id,
-                    range=range_val
-                ).execute()
-                rows = result.get('values', [])
-                
-                # Calculate class stats and find student
-                sheet_totals = []
-                student_data = None
-                
-                for row in rows:
-                    if row and len(row) >= 2:
-                        # Calculate total for class average
-                        current_row_total = 0
-                        current_raw_marks = row[2:]
-                        for i, m in enumerate(current_raw_marks):
-                            if i < len(headers):
-                                label = headers[i]
-                                if label.lower() != 'total':
-                                    try:
-                                        mark_value = float(m.replace('%','').strip()) if m else 0
-                                        current_row_total += mark_value
-                                    except: 
-                                        pass
-                        
-                        sheet_totals.append(current_row_total)
-
-                        # Check if this is our student
-                        row_roll = row[0].strip()
-                        if row_roll.lower() == roll_number.lower():
-                            student_name = row[1].strip()
-                            
-                            # Build marks array
-                            marks_array = []
-                            for i, mark in enumerate(current_raw_marks):
-                                if i < len(headers):
-                                    label = headers[i]
-                                    value = mark if mark else '-'
-                                    marks_array.append({"label": label, "value": value})
-                            
-                            student_data = {
-                                "rollNumber": row_roll,
-                                "name": student_name,
-                                "sheetName": name,
-                                "sheetId": sheet_id,
-                                "marks": marks_array,
-                                "total": current_row_total
-                            }
-                            # DO NOT BREAK here. We need to process all rows for class stats.
-                
-                # If student found in this sheet, calculate stats and add to list
-                if student_data:
-                    # Calculate Stats
-                    class_avg = sum(sheet_totals) / len(sheet_totals) if sheet_totals else 0
-                    
-                    # Calculate Rank
-                    # Sort totals descending
-                    sorted_totals = sorted(sheet_totals, reverse=True)
-                    # Find index of student's total (+1 for 1-based rank)
-                    # Note: index() finds first occurrence, so ties get same rank (e.g. 1, 2, 2, 4)
-                    try:
-                        student_rank = sorted_totals.index(student_data['total']) + 1
-                    except ValueError:
-                        student_rank = 0 # Should not happen
-                        
-                    total_students = len(sheet_totals)
-
-                    student_subjects.append({
-                        **student_data,
-                        "classAverage": round(class_avg, 2),
-                        "rank": student_rank,
-                        "totalStudents": total_students
-                    })
-
-            except Exception as e:
-                print(f"Error reading sheet {name}: {e}")
-                err_str = str(e)
-                if "403" in err_str: 
-                    sheet_errors.append(f"{name}: Permission Denied")
-                elif "404" in err_str: 
-                    sheet_errors.append(f"{name}: Not Found")
-                else: 
-                    sheet_errors.append(f"{name}: {str(e)[:50]}")
-                continue
+        dependencies = [sources_dependency()]
+        missing_key = ("subjects", normalize_roll(roll_number), dependencies[0])
+        missing_detail = missing_roll_detail(missing_key)
+        if missing_detail:
+            raise HTTPException(status_code=404, detail=missing_detail)
+
+        # Sheet reads may wait on another worker's refresh: keep them off the event loop
+        matches = await run_in_threadpool(lambda: list(locate_student(roll_number, sources, dependencies, sheet_errors)))
+        for sheet_id, name, snapshot, table, row in matches:
+            headers = snapshot["headers"]
+            record = StudentRecord(row, intern_headers(headers))
+
+            # Build marks array
+            marks_array = []
+            for i, mark in enumerate(row[2:]):
+                if i < len(headers):
+                    marks_array.append({"label": headers[i], "value": mark if mark else '-'})
+
+            student_subjects.append({
+                "rollNumber": record.rollNumber,
+                "name": record.name,
+                "sheetName": name,
+                "sheetId": sheet_id,
+                "marks": marks_array,
+                "total": record.total,
+                "classAverage": round(table["classAverage"], 2),
+                "rank": rank_of(table["sortedTotals"], record.total),
+                "totalStudents": len(table["totals"])
+            })
 
         # Return results
         if student_subjects:
+            response.headers["ETag"] = issue_etag(etag_key, dependencies)
+            response.headers["Cache-Control"] = CONDITIONAL_CACHE_CONTROL
             return {
                 "success": True,
                 "subjects": student_subjects,
                 "totalSubjects": len(student_subjects)
             }
         else:
+            error_detail = f"No marks found for student: {roll_number}"
+            if sheet_errors:
+                error_detail += f". Some sheets had errors: {'; '.join(sheet_errors[:3])}"
+            else:
+                remember_missing_roll(missing_key, error_detail)
+            raise HTTPException(status_code=404, detail=error_detail)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+@app.get("/api/student/standing/{roll_number:path}")
+async def get_student_standing(roll_number: str, request: Request, response: Response,
+                               bands: int = Query(2, ge=0, le=10)):
+    """
+    Where a student stands in each subject: rank (ties share the best rank),
+    percentile and the nearest score bands above and below.
+    """
+    try:
+        if not sheets_service:
+            raise HTTPException(status_code=500, detail="Google Sheets service not initialized")
+
+        etag_key = ("standing", roll_number.strip().lower(), bands)
+        not_modified = check_not_modified(request, etag_key)
+        if not_modified:
+            return not_modified
+
+        sources = get_sheet_sources()
+        standings = []
+        sheet_errors = []
+        dependencies = [sources_dependency()]
+
+        # Sheet reads may wait on another worker's refresh: keep them off the event loop
+        matches = await run_in_threadpool(lambda: list(locate_student(roll_number, sources, dependencies, sheet_errors)))
+        for sheet_id, name, snapshot, table, row in matches:
+            record = StudentRecord(row, intern_headers(snapshot["headers"]))
+            standings.append({
+                "sheetId": sheet_id,
+                "sheetName": name,
+                "rollNumber": record.rollNumber,
+                "name": record.name,
+                "total": record.total,
+                "classAverage": round(table["classAverage"], 2),
+                **score_standing(table["sortedTotals"], record.total, bands)
+            })
+
+        if not standings:
             error_detail = f"No marks found for student: {roll_number}"
             if sheet_errors:
                 error_detail += f". Some sheets had errors: {'; '.join(sheet_errors[:3])}"
             raise HTTPException(status_code=404, detail=error_detail)
 
+        response.headers["ETag"] = issue_etag(etag_key, dependencies)
+        response.headers["Cache-Control"] = CONDITIONAL_CACHE_CONTROL
+        return {"success": True, "subjects": standings, "totalSubjects": len(standings)}
+
     except HTTPException:
         raise
     except Exception as e:
@@ -1038,17 +2824,17 @@ async def register_admin(admin: AdminRegister):
 
     # 1. OPTION A: Google Sheets DB (Permanent -> admin_data)
     # Check duplicates in sheet
-    sheet_admins = get_sheet_users("ADMIN_SHEET_ID")
-
     # MULTI-ADMIN SUPPORT: Removed single-admin restriction
     # if len(sheet_admins) > 0:
     #     raise HTTPException(status_code=403, detail="Registration Closed. Only one Admin account is allowed.")
 
-    if any(u['email'].lower() == admin.email.lower() for u in sheet_admins):
+    if find_sheet_user("ADMIN_SHEET_ID", lambda u: u['email'].lower() == admin.email.lower()):
         raise HTTPException(status_code=400, detail="Admin already registered (in Sheet)")
 
     success, msg = append_user_to_sheet("ADMIN_SHEET_ID", 'admin', 'Admin', admin.name, admin.email, hashed_password)
     if success:
+        # The first registered admin owns legacy (ownerless) sources
+        invalidate_sources_cache()
         return {"success": True, "message": "Admin Registration successful! Account saved to Google Sheet."}
     else:
         # If sheet write fails, we MUST tell the user why (Permissions? Tab Name?)
@@ -1077,13 +2863,11 @@ async def register_admin(admin: AdminRegister):
 
 @app.post("/api/admin/login")
 async def login_admin(credentials: AdminLogin):
-    # 1. OPTION A: Google Sheet DB
-    sheet_admins = get_sheet_users("ADMIN_SHEET_ID")
-
+    # 1. OPTION A: Google Sheet DB (in-memory directory)
     # Robust matching (Fix for Mobile users adding spaces)
     input_email = credentials.email.strip().lower()
 
-    admin_user = next((u for u in sheet_admins if u['email'].strip().lower() == input_email), None)
+    admin_user = find_sheet_user("ADMIN_SHEET_ID", lambda u: u['email'].strip().lower() == input_email)
 
     if admin_user:
         if verify_password(credentials.password, admin_user['password']):
@@ -1094,11 +2878,7 @@ async def login_admin(credentials: AdminLogin):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     # 2. OPTION B: SQLite Fallback
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM admins WHERE email = ?", (credentials.email,))
-    admin = cursor.fetchone()
-    conn.close()
+    admin = await run_db(db_fetchone, "SELECT * FROM admins WHERE email = ?", (credentials.email,))
 
     if not admin or not verify_password(credentials.password, admin['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -1116,6 +2896,94 @@ async def login_admin(credentials: AdminLogin):
         }
     }
 
+def require_admin(authorization: Optional[str]) -> str:
+    """Email of the admin in a Bearer token (admin tokens carry an "id" claim)"""
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        scheme, _, param = authorization.partition(" ")
+        payload = decode_access_token(param)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if "id" not in payload:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return payload.get("email")
+
+def read_csv_upload(text: str, keywords, defaults):
+    """
+    Non-empty rows of an uploaded CSV as [(line_no, cells)] and the column of
+    each keyword. The first non-empty row is a header when it names a roll
+    column; columns it does not name (or all of them, without a header) get
+    the defaults.
+    """
+    import csv
+    import io
+
+    rows = [(line_no, [c.strip() for c in row]) for line_no, row in enumerate(csv.reader(io.StringIO(text)), 1)]
+    rows = [(line_no, cells) for line_no, cells in rows if any(cells)]
+    columns = tuple(defaults)
+    if rows and any("roll" in c.lower() for c in rows[0][1]):
+        # Header row: locate the columns by name
+        lowered = [c.lower() for c in rows[0][1]]
+        columns = tuple(next((i for i, c in enumerate(lowered) if keyword in c), default)
+                        for keyword, default in zip(keywords, defaults))
+        rows = rows[1:]
+    return columns, rows
+
+@app.post("/api/admin/import-students")
+async def import_students(file: UploadFile = File(...), authorization: Optional[str] = Header(None)):
+    """
+    Bulk-create student accounts from a CSV of roll number, name, password
+    (header row optional). Returns a result for every line.
+    """
+    require_admin(authorization)
+
+    raw = await file.read()
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV must be UTF-8 encoded")
+
+    # 1. Parse and validate rows
+    results = []
+    accepted = []  # (result, roll, name, password)
+    existing = get_user_roll_index("STUDENT_SHEET_ID")
+    seen_in_file = set()
+    columns, rows = read_csv_upload(text, ("roll", "name", "pass"), (0, 1, 2))
+
+    for line_no, cells in rows:
+        roll, name, password = (cells[i] if i < len(cells) else "" for i in columns)
+        result = {"line": line_no, "rollNumber": roll}
+        results.append(result)
+        key = roll.lower()
+
+        if not roll or not password:
+            result.update(status="invalid", message="Roll number and password are required")
+        elif key in existing:
+            result.update(status="duplicate", message="Student already registered")
+        elif key in seen_in_file:
+            result.update(status="duplicate", message="Roll number repeated in file")
+        else:
+            seen_in_file.add(key)
+            accepted.append((result, roll, name, password))
+
+    # 2. Hash in parallel, then write every new account in one append
+    if accepted:
+        hashes = await hash_passwords_parallel([a[3] for a in accepted])
+        new_rows = [['student', roll, name, "", hashed] for (_, roll, name, _), hashed in zip(accepted, hashes)]
+        success, msg = append_users_to_sheet("STUDENT_SHEET_ID", new_rows)
+        for result, *_ in accepted:
+            if success:
+                result.update(status="created", message="Account created")
+            else:
+                result.update(status="error", message=msg)
+
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+
+    return {"success": True, "summary": summary, "results": results}
+
 class UpdateSource(BaseModel):
     oldSheetId: str
     sheetId: str
@@ -1127,7 +2995,7 @@ async def add_source(source: AddSource, token: str = Header(..., alias="Authoriz
     # 1. Verify User
     try:
         scheme, _, param = token.partition(" ")
-        payload = jwt.decode(param, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(param)
         admin_email = payload.get("email")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
@@ -1136,6 +3004,7 @@ async def add_source(source: AddSource, token: str = Header(..., alias="Authoriz
     success, msg = append_source_to_sheet(source.sheetId, source.range or "Sheet1!A2:Z", source.name or "", admin_email)
     if success:
         # Refresh immediately
+        invalidate_sources_cache()
         fetch_students_from_sheets()
         return {"success": True, "message": "Source added permanently to Admin Sheet!"}
     else:
@@ -1152,55 +3021,47 @@ async def delete_source(data: DeleteSource):
         raise HTTPException(status_code=500, detail="Services not configured")
 
     try:
-        # Read all sources (including Owner Email in Column D)
-        result = sheets_service.spreadsheets().values().get(
-            spreadsheetId=config_sheet_id,
-            range="Sources!A:D"
-        ).execute()
-        rows = result.get('values', [])
-        
-        if not rows:
-             return {"success": True, "message": "No sources to delete"}
-
-        # Filter out the matching row
-        # Keep header row (index 0)
-        new_rows = [rows[0]] if rows else []
-        found = False
-        
-        for idx, row in enumerate(rows):
-            if idx == 0: continue
-            # Check sheet ID (Column A)
-            if len(row) > 0:
-                row_sid = row[0].strip()
-                if not row_sid: continue # Filter out already empty rows
-                if row_sid == data.sheetId:
-                    found = True
-                    continue # Skip this row (delete)
-                new_rows.append(row)
-            
-        if not found:
-            # If not found but we are cleaning up, we might not want to raise error?
-            # But the user expected to delete something.
-            pass 
-
-        # Clear the sheet first to remove old data (Columns A to D)
-        sheets_service.spreadsheets().values().clear(
-            spreadsheetId=config_sheet_id,
-            range="Sources!A:D"
-        ).execute()
-
-        # Write back the kept rows
-        body = {"values": new_rows}
-        sheets_service.spreadsheets().values().update(
-            spreadsheetId=config_sheet_id,
-            range="Sources!A1",
-            valueInputOption="RAW",
-            body=body
-        ).execute()
-        
+        tab_id = _sources_tab_id(config_sheet_id)
+        with sources_tab_edit(config_sheet_id):
+            # Locate the row(s) through the cached index, verified by reading them
+            # right before the delete (a mismatch re-reads the whole tab)
+            located = locate_source_rows(config_sheet_id, data.sheetId)
+            if not located:
+                # Maybe it was never sent: drop it from the write-behind queue
+                if cancel_pending_appends(config_sheet_id, SOURCES_RANGE, lambda row: row[0].strip() == data.sheetId):
+                    invalidate_snapshots(data.sheetId)
+                    return {"success": True, "message": "Source deleted successfully"}
+                return {"success": True, "message": "No sources to delete"}
+
+            # Delete bottom-up in one batch so earlier row numbers stay valid
+            row_numbers = sorted((n for n, _ in located), reverse=True)
+            sheets_service.spreadsheets().batchUpdate(
+                spreadsheetId=config_sheet_id,
+                body={"requests": [
+                    {"deleteDimension": {"range": {
+                        "sheetId": tab_id,
+                        "dimension": "ROWS",
+                        "startIndex": n - 1,
+                        "endIndex": n
+                    }}}
+                    for n in row_numbers
+                ]}
+            ).execute()
+
+            # Mirror the delete in the cached table
+            cancel_pending_appends(config_sheet_id, SOURCES_RANGE, lambda row: row[0].strip() == data.sheetId, include_sent=True)
+            rows = list(_sources_cache["rows"] or [])
+            for n in row_numbers:
+                if n - 1 < len(rows):
+                    del rows[n - 1]
+            _set_cached_source_rows(rows)
+
+        invalidate_snapshots(data.sheetId)
         fetch_students_from_sheets()
         return {"success": True, "message": "Source deleted successfully"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Delete failed: {e}")
         raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
@@ -1213,40 +3074,50 @@ async def update_source(data: UpdateSource):
         raise HTTPException(status_code=500, detail="Services not configured")
 
     try:
-        # Read all sources to find index and preserve existing owner email
-        result = sheets_service.spreadsheets().values().get(
-            spreadsheetId=config_sheet_id,
-            range="Sources!A:D"
-        ).execute()
-        rows = result.get('values', [])
-        
-        row_index = -1
-        owner_email = ""
-        # Skip header row (index 0), data starts at row 2 (index 1) in Python list, but sheet row is index+1
-        for idx, row in enumerate(rows):
-            if idx == 0: continue # Skip Header
-            if len(row) > 0 and row[0].strip() == data.oldSheetId:
-                row_index = idx + 1 # 1-based index for API
-                # Preserve existing owner email from Column D (index 3)
-                owner_email = row[3] if len(row) > 3 else ""
-                break
-        
-        if row_index == -1:
-            raise HTTPException(status_code=404, detail="Source sheet not found to update")
+        with sources_tab_edit(config_sheet_id):
+            # Find the row through the cached index (verified with a one-row read)
+            located = locate_source_rows(config_sheet_id, data.oldSheetId)
+            if not located:
+                # Still queued: rewrite the queued row, keeping its owner
+                queued = _unsent_appends(config_sheet_id, SOURCES_RANGE, lambda row: row[0].strip() == data.oldSheetId)
+                if queued:
+                    queued_row = queued[0][1]
+                    owner_email = queued_row[3] if len(queued_row) > 3 else ""
+                    replace_pending_append(config_sheet_id, SOURCES_RANGE, lambda row: row[0].strip() == data.oldSheetId,
+                                           [data.sheetId, data.range, data.name, owner_email])
+                    invalidate_snapshots(data.oldSheetId)
+                    return {"success": True, "message": "Source updated successfully"}
+                raise HTTPException(status_code=404, detail="Source sheet not found to update")
+
+            row_index, live_row = located[0]
+            # Preserve existing owner email from Column D (index 3)
+            owner_email = live_row[3] if len(live_row) > 3 else ""
             
-        # Update specific row including preserved owner email
-        body = {"values": [[data.sheetId, data.range, data.name, owner_email]]}
-        sheets_service.spreadsheets().values().update(
-            spreadsheetId=config_sheet_id,
-            range=f"Sources!A{row_index}:D{row_index}",
-            valueInputOption="RAW",
-            body=body
-        ).execute()
-        
+            # Update specific row including preserved owner email
+            new_row = [data.sheetId, data.range, data.name, owner_email]
+            sheets_service.spreadsheets().values().update(
+                spreadsheetId=config_sheet_id,
+                range=f"Sources!A{row_index}:D{row_index}",
+                valueInputOption="RAW",
+                body={"values": [new_row]}
+            ).execute()
+
+            cancel_pending_appends(config_sheet_id, SOURCES_RANGE, lambda row: row[0].strip() == data.oldSheetId, include_sent=True)
+            rows = list(_sources_cache["rows"] or [])
+            if row_index - 1 < len(rows):
+                rows[row_index - 1] = new_row
+                _set_cached_source_rows(rows)
+            else:
+                invalidate_sources_cache()
+
         # Trigger refresh
+        invalidate_snapshots(data.oldSheetId)
+        invalidate_snapshots(data.sheetId)
         fetch_students_from_sheets()
         return {"success": True, "message": "Source updated successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -1259,6 +3130,8 @@ async def refresh_data():
     # In a strict app we would add: current_user: dict = Depends(get_current_admin)
     global student_cache
     student_cache = []
+    invalidate_sources_cache()
+    invalidate_snapshots()
     # Trigger fetch immediately
     fetch_students_from_sheets()
     return {"success": True, "message": "Data refreshed from Google Sheets"}
@@ -1271,7 +3144,7 @@ async def get_sources(authorization: str = Header(None)):
     if authorization:
         try:
             scheme, _, param = authorization.partition(" ")
-            payload = jwt.decode(param, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = decode_access_token(param)
             admin_email = payload.get("email")
         except:
             pass  # If token invalid, return all sources (or none for security)
@@ -1280,9 +3153,144 @@ async def get_sources(authorization: str = Header(None)):
     sources = get_sheet_sources(admin_email)
     
     # Format for frontend
-    data = [{"sheetId": s[0], "range": s[1], "name": s[2] if len(s) > 2 else s[0][:15] + "..."} for s in sources]
+    data = [{"sheetId": s[0], "range": s[1], "name": s[2] if len(s) > 2 else s[0][:15] + "...",
+             "status": source_health(s[0], s[1])} for s in sources]
     return {"success": True, "sources": data}
 
+# Admin student search
+# Type-ahead over roll numbers and names of the admin's own sheets. Each sheet
+# gets a search index per snapshot version: a sorted key list for prefix
+# matches (bisect) and a trigram posting list for fuzzy matches. Keys are
+# lowercase letters and digits only, so "bscs001" finds "BSCS-001".
+SEARCH_MATCH_ROLL = 0
+SEARCH_MATCH_ROLL_PREFIX = 1
+SEARCH_MATCH_NAME_PREFIX = 2
+SEARCH_MATCH_SUBSTRING = 3
+SEARCH_MATCH_FUZZY = 4
+SEARCH_MATCH_NAMES = ["exact", "roll-prefix", "name-prefix", "substring", "fuzzy"]
+SEARCH_MIN_SIMILARITY = 0.5
+
+_search_indexes = {}  # (sheet_id, range) -> StudentSearchIndex
+
+def _search_key(text) -> str:
+    return "".join(ch for ch in str(text).lower() if ch.isalnum())
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class StudentSearchIndex:
+    __slots__ = ("version", "entries", "keys", "grams")
+
+    def __init__(self, snapshot):
+        self.version = snapshot["version"]
+        self.entries = []  # (roll, name, roll key, name key, row position)
+        keys = []
+        self.grams = {}
+        for position, row in enumerate(snapshot["rows"]):
+            if not row or len(row) < 2 or not row[0].strip():
+                continue
+            roll, name = row[0].strip(), row[1].strip()
+            entry = len(self.entries)
+            roll_key, name_key = _search_key(roll), _search_key(name)
+            self.entries.append((roll, name, roll_key, name_key, position))
+            keys.append((roll_key, SEARCH_MATCH_ROLL_PREFIX, entry))
+            for word in name.lower().split():
+                keys.append((_search_key(word), SEARCH_MATCH_NAME_PREFIX, entry))
+            for gram in _trigrams(roll_key) | _trigrams(name_key):
+                self.grams.setdefault(gram, []).append(entry)
+        keys.sort()
+        self.keys = keys
+
+    def search(self, query_key: str, limit: int):
+        """[(match, -similarity, entry)] best first"""
+        import bisect
+        found = {}
+
+        # Prefix matches on the roll number or any word of the name
+        i = bisect.bisect_left(self.keys, (query_key,))
+        while i < len(self.keys) and self.keys[i][0].startswith(query_key):
+            key, match, entry = self.keys[i]
+            if match == SEARCH_MATCH_ROLL_PREFIX and key == query_key:
+                match = SEARCH_MATCH_ROLL
+            found[entry] = min(found.get(entry, (match, -1.0)), (match, -1.0))
+            i += 1
+
+        # Fuzzy matches: share enough trigrams with the query
+        if len(query_key) >= 3:
+            query_grams = _trigrams(query_key)
+            counts = {}
+            for gram in query_grams:
+                for entry in self.grams.get(gram, ()):
+                    counts[entry] = counts.get(entry, 0) + 1
+            for entry, shared in counts.items():
+                if entry in found:
+                    continue
+                roll_key, name_key = self.entries[entry][2], self.entries[entry][3]
+                if query_key in roll_key or query_key in name_key:
+                    found[entry] = (SEARCH_MATCH_SUBSTRING, -1.0)
+                    continue
+                similarity = shared / len(query_grams)
+                if similarity >= SEARCH_MIN_SIMILARITY:
+                    found[entry] = (SEARCH_MATCH_FUZZY, -similarity)
+
+        ranked = sorted((match, score, entry) for entry, (match, score) in found.items())
+        return ranked[:limit]
+
+def get_search_index(snapshot) -> StudentSearchIndex:
+    key = (snapshot["sheetId"], snapshot["range"])
+    index = _search_indexes.get(key)
+    if index is None or index.version != snapshot["version"]:
+        index = StudentSearchIndex(snapshot)
+        _search_indexes[key] = index
+    return index
+
+@app.get("/api/admin/search")
+def search_students(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=100),
+                    authorization: Optional[str] = Header(None)):
+    """
+    Type-ahead student search over the admin's own sheets.
+    Ranked: exact roll, roll prefix, name word prefix, substring, then fuzzy (trigram) matches.
+    """
+    admin_email = require_admin(authorization)
+    query_key = _search_key(q)
+    if not query_key:
+        raise HTTPException(status_code=400, detail="Search query needs letters or digits")
+    if not sheets_service:
+        raise HTTPException(status_code=500, detail="Google Sheets service not initialized")
+
+    started = time.perf_counter()
+    results = []
+    sheet_errors = []
+    for source in get_sheet_sources(admin_email):
+        sheet_id, range_val = source[0], source[1]
+        sheet_name = source[2] if len(source) > 2 else "Unknown"
+        try:
+            index = get_search_index(get_sheet_snapshot(sheet_id, range_val))
+        except Exception as e:
+            sheet_errors.append(f"{sheet_name}: {str(e)[:50]}")
+            continue
+        for match, score, entry in index.search(query_key, limit):
+            roll, name, _, _, position = index.entries[entry]
+            results.append(((match, score, roll.lower(), sheet_name), {
+                "rollNumber": roll,
+                "name": name,
+                "sheetId": sheet_id,
+                "sheetName": sheet_name,
+                "row": position,
+                "match": SEARCH_MATCH_NAMES[match],
+                "score": round(-score, 2)
+            }))
+
+    results.sort(key=lambda r: r[0])
+    return {
+        "success": True,
+        "query": q,
+        "results": [r[1] for r in results[:limit]],
+        "errors": sheet_errors,
+        "tookMs": round((time.perf_counter() - started) * 1000, 2)
+    }
+
 def calculate_relative_grade(score, all_scores, student_index=None):
     """
     Calculate relative grade based on university marking system
@@ -1315,6 +3323,10 @@ def calculate_relative_grade(score, all_scores, student_index=None):
     except ValueError:
         rank = len(sorted_scores)
     
+    return _relative_grade_for_rank(rank, sorted_scores)
+
+def _relative_grade_for_rank(rank: int, sorted_scores) -> str:
+    """Relative grade for a 1-based rank in the descending score list (ties share the first rank)"""
     total_students = len(sorted_scores)
     
     # Calculate percentile (what percentage of students this student beat)
@@ -1367,233 +3379,373 @@ def calculate_relative_grade(score, all_scores, student_index=None):
 
 @app.post("/api/admin/save-manual-grades")
 async def save_manual_grades(payload: ManualGradesPayload):
+    try:
+        saved = await run_db(save_manual_grades_bulk, payload.sheetId, [(e.rollNumber, e.grade) for e in payload.grades])
+        return {"success": True, "message": "Manual grades saved successfully", "saved": saved}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save grades: {str(e)}")
+
+@app.post("/api/admin/upload-manual-grades")
+async def upload_manual_grades(sheetId: str = Form(...), file: UploadFile = File(...),
+                               authorization: Optional[str] = Header(None)):
+    """
+    Bulk manual grades from a CSV file: one "roll number, grade" pair per line.
+    A header row (e.g. "Roll Number,Grade") is detected and skipped.
+    Only the admin who owns the sheet may upload grades for it.
+    """
+    admin_email = require_admin(authorization)
+    if not any(source[0] == sheetId for source in get_sheet_sources(admin_email)):
+        raise HTTPException(status_code=403, detail="You do not have access to this sheet")
+
+    raw = await file.read()
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV must be UTF-8 encoded")
+
+    entries = []
+    skipped = []
+    (roll_col, grade_col), rows = read_csv_upload(text, ("roll", "grade"), (0, None))
+    if grade_col is None:
+        grade_col = 1 if roll_col != 1 else 0
+    for line_no, cells in rows:
+        roll = cells[roll_col] if len(cells) > roll_col else ""
+        grade = cells[grade_col] if len(cells) > grade_col else ""
+        if not roll or not grade:
+            skipped.append({"line": line_no, "reason": "Missing roll number or grade"})
+            continue
+        entries.append((roll, grade))
+
+    if not entries:
+        raise HTTPException(status_code=400, detail="No grades found in CSV")
+
+    try:
+        saved = await run_db(save_manual_grades_bulk, sheetId, entries)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save grades: {str(e)}")
+    return {"success": True, "message": f"Saved {saved} manual grades", "saved": saved, "skipped": skipped}
+
+# Manual override cache: sheet_id -> (version, {roll: grade}).
+# Writes bump manual_grade_versions in the same transaction, so a cached copy
+# is reused until any worker saves grades for that sheet.
+_manual_override_cache = {}
+
+def save_manual_grades_bulk(sheet_id: str, entries) -> int:
+    """Upsert (roll_number, grade) pairs in one transaction. Returns the number saved."""
+    rows = [(sheet_id, roll.strip(), grade.strip()) for roll, grade in entries]
     conn = get_db()
-    cursor = conn.cursor()
     try:
-        # Use transaction
-        for entry in payload.grades:
-            cursor.execute('''
-                INSERT INTO manual_grades (sheet_id, roll_number, grade) 
-                VALUES (?, ?, ?)
-                ON CONFLICT(sheet_id, roll_number) 
-                DO UPDATE SET grade=excluded.grade, updated_at=CURRENT_TIMESTAMP
-            ''', (payload.sheetId, entry.rollNumber, entry.grade))
+        conn.executemany('''
+            INSERT INTO manual_grades (sheet_id, roll_number, grade) 
+            VALUES (?, ?, ?)
+            ON CONFLICT(sheet_id, roll_number) 
+            DO UPDATE SET grade=excluded.grade, updated_at=CURRENT_TIMESTAMP
+        ''', rows)
+        conn.execute('''
+            INSERT INTO manual_grade_versions (sheet_id, version) VALUES (?, 1)
+            ON CONFLICT(sheet_id) DO UPDATE SET version = version + 1
+        ''', (sheet_id,))
         conn.commit()
-        return {"success": True, "message": "Manual grades saved successfully"}
-    except Exception as e:
+    except Exception:
         conn.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to save grades: {str(e)}")
+        raise
     finally:
         conn.close()
+        _manual_override_cache.pop(sheet_id, None)
+    return len(rows)
+
+def get_manual_override_version(sheet_id: str) -> int:
+    row = db_fetchone("SELECT version FROM manual_grade_versions WHERE sheet_id = ?", (sheet_id,))
+    return row['version'] if row else 0
 
 def get_manual_overrides(sheet_id: str):
+    return get_manual_overrides_versioned(sheet_id)[1]
+
+def get_manual_overrides_versioned(sheet_id: str):
+    """(version, {roll: grade}) of a sheet's manual grades"""
+    version = get_manual_override_version(sheet_id)
+    cached = _manual_override_cache.get(sheet_id)
+    if cached and cached[0] == version:
+        return cached
+
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT roll_number, grade FROM manual_grades WHERE sheet_id = ?", (sheet_id,))
     rows = cursor.fetchall()
     conn.close()
-    return {row['roll_number']: row['grade'] for row in rows}
+    overrides = {row['roll_number']: row['grade'] for row in rows}
+    _manual_override_cache[sheet_id] = (version, overrides)
+    return version, overrides
 
-def calculate_custom_grade(score, all_scores, config: GradingConfig, roll_number=None, manual_overrides=None):
-    if not all_scores or score is None:
-        return "N/A"
+def _percentage_grade(score, sorted_ranges, current_max: float = CURRENT_MARKS_MAXIMUM) -> str:
+    # Percentage of the current assessments' maximum (from the sheet schema)
+    percentage = (score / current_max) * 100 if current_max > 0 else 0
     
-    # 1. Manual
-    if config.method == 'manual':
-        if manual_overrides and roll_number and roll_number in manual_overrides:
-            return manual_overrides[roll_number]
-        # Fallback to current relative grade if no manual override exists yet
-        return calculate_relative_grade(score, all_scores)
-
-    # 2. Percentage Based
-    if config.method == 'percentage-based' and config.ranges:
-        # Check against ranges (e.g., {'A': 80}) meaning >= 80
-        sorted_ranges = sorted(config.ranges.items(), key=lambda x: x[1], reverse=True)
-        
-        # Calculate Percentage (of 55? or 100?)
-        # User implies percentage of course. Current marks max is 55.
-        current_max = 55
-        percentage = (score / current_max) * 100 if current_max > 0 else 0
-        
-        for grade, min_percent in sorted_ranges:
-            if percentage >= min_percent:
+    for grade, min_percent in sorted_ranges:
+        if percentage >= min_percent:
+            return grade
+    return "F" # Default if below all ranges
+
+def _class_limit_grade(rank: int, limits) -> str:
+    count = 0
+    ordered_grades = ['A+', 'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'D-', 'F']
+    
+    for grade in ordered_grades:
+        limit = limits.get(grade, 0)
+        if limit > 0:
+            if rank <= count + limit:
                 return grade
-        return "F" # Default if below all ranges
-        
-    # 3. Class Limits
-    elif config.method == 'class-limits' and config.limits:
-        # Need rank
-        sorted_scores = sorted([s for s in all_scores if s is not None], reverse=True)
-        try:
-            rank = sorted_scores.index(score) + 1 # 1-based
-        except ValueError:
-            rank = len(sorted_scores)
-            
-        count = 0
-        ordered_grades = ['A+', 'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'D-', 'F']
-        
-        for grade in ordered_grades:
-            limit = config.limits.get(grade, 0)
-            if limit > 0:
-                if rank <= count + limit:
-                    return grade
-                count += limit
-        
-        # If limits exceeded (overflow), assign F or lowest?
-        return "F"
-        
-    # 4. Automatic (Default)
-    else:
-        return calculate_relative_grade(score, all_scores)
+            count += limit
+    
+    # If limits exceeded (overflow), assign F or lowest?
+    return "F"
 
+def grade_totals(totals, config: Optional[GradingConfig] = None, rolls=None, manual_overrides=None,
+                 max_marks: float = CURRENT_MARKS_MAXIMUM) -> List[str]:
+    """
+    Grades for a whole score vector. Percentage-based grading is relative to
+    max_marks (the sheet schema's maxMarks); without a config every student
+    gets calculate_relative_grade(). The scores are sorted once for all students.
+    """
+    if not totals:
+        return []
+    sorted_scores = sorted(totals, reverse=True)
+    first_rank = {}
+    for position, score in enumerate(sorted_scores, 1):
+        first_rank.setdefault(score, position)
 
-def _fetch_sheet_statistics_internal(sheet_id: str, range_val: str, sheet_name: str):
+    method = config.method if config else "automatic"
+    if method == 'percentage-based' and config.ranges:
+        sorted_ranges = sorted(config.ranges.items(), key=lambda x: x[1], reverse=True)
+        return [_percentage_grade(score, sorted_ranges, max_marks) for score in totals]
+    if method == 'class-limits' and config.limits:
+        return [_class_limit_grade(first_rank[score], config.limits) for score in totals]
+
+    grades = [_relative_grade_for_rank(first_rank[score], sorted_scores) for score in totals]
+    if method == 'manual' and manual_overrides and rolls:
+        grades = [manual_overrides[roll] if roll and roll in manual_overrides else grade
+                  for roll, grade in zip(rolls, grades)]
+    return grades
+
+
+GRADE_ORDER = ['A+', 'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'D-', 'F']
+
+def _grade_sheet_table(schema: SheetSchema, config: Optional[GradingConfig] = None, manual_overrides=None):
     """
-    Internal helper to fetch sheet stats without re-fetching source config.
+    Grade a sheet in a single pass over the totals without building per-student dicts.
+    Records come from the sheet schema (converted once per snapshot); response
+    dicts are materialized on demand by _student_at() in ranking order.
     """
+    headers = schema.headers
+    records = schema.records
+    all_totals = [record.total for record in records]
+    subject_sums = {}
+    subject_counts = {}
+
+    for record in records:
+        for i, value in enumerate(record.marks):
+            label = headers[i]
+            if label.lower() != 'total' and value == value:
+                subject_sums[label] = subject_sums.get(label, 0) + value
+                subject_counts[label] = subject_counts.get(label, 0) + 1
+
+    grades = grade_totals(all_totals, config, [r.rollNumber for r in records], manual_overrides, schema.maxMarks)
+
+    # Ranking order: highest total first, sheet order kept for ties
+    order = sorted(range(len(all_totals)), key=lambda i: all_totals[i], reverse=True)
+
+    grade_distribution = {grade: 0 for grade in GRADE_ORDER}
+    for grade in grades:
+        grade_distribution[grade] = grade_distribution.get(grade, 0) + 1
+
+    return {
+        "headers": headers,
+        "records": records,
+        "totals": all_totals,
+        "sortedTotals": sorted(all_totals),
+        "grades": grades,
+        "order": order,
+        "maxMarks": schema.maxMarks,
+        "schema": schema.describe(),
+        "classAverage": sum(all_totals) / len(all_totals) if all_totals else 0,
+        "subjectAverages": {k: subject_sums[k] / subject_counts[k] for k in subject_sums},
+        "gradeDistribution": grade_distribution
+    }
+
+# Graded table cache (LRU)
+# Keyed by everything a graded table depends on: the snapshot's content
+# version, the canonical grading config hash and, for manual grading, the
+# manual-override version. A change to any of them is simply a new key.
+_grade_cache = OrderedDict()
+_grade_cache_lock = threading.Lock()
+
+def get_graded_table(snapshot, config: Optional[GradingConfig] = None, manual_overrides=None,
+                     override_version: Optional[int] = None):
+    """_grade_sheet_table() for a snapshot, reused while its inputs are unchanged"""
+    key = (
+        snapshot["sheetId"], snapshot["range"], snapshot["version"],
+        grading_config_hash(config) if config is not None else None,
+        override_version if config is not None and config.method == 'manual' else None
+    )
+    with _grade_cache_lock:
+        table = _grade_cache.get(key)
+        if table is not None:
+            _grade_cache.move_to_end(key)
+            return table
+
+    table = _grade_sheet_table(get_sheet_schema(snapshot), config, manual_overrides)
+    with _grade_cache_lock:
+        _grade_cache[key] = table
+        while len(_grade_cache) > GRADE_CACHE_SIZE:
+            _grade_cache.popitem(last=False)
+    return table
+
+def _student_at(table, idx: int) -> Dict[str, Any]:
+    """Build the response dict for the student at row index idx of a graded table"""
+    record = table["records"][idx]
+    total = record.total
+    # Percentage based on the current assessments' maximum, not the 100 course marks
+    current_marks_maximum = table["maxMarks"]
+    return {
+        'rollNumber': record.rollNumber,
+        'name': record.name,
+        'marks': record.marks_dict(),
+        'total': total,
+        'grade': table["grades"][idx],
+        'percentage': round((total / current_marks_maximum) * 100, 2) if current_marks_maximum > 0 else 0
+    }
+
+def _statistics_block(table) -> Dict[str, Any]:
+    all_totals = table["totals"]
+    return {
+        "totalStudents": len(all_totals),
+        "classAverage": round(table["classAverage"], 2),
+        "subjectAverages": {k: round(v, 2) for k, v in table["subjectAverages"].items()},
+        "highestScore": max(all_totals) if all_totals else 0,
+        "lowestScore": min(all_totals) if all_totals else 0,
+        "headers": table["headers"],
+        "gradeDistribution": table["gradeDistribution"],
+        "totalPossibleMarks": 100,
+        "currentMarksTotal": table["maxMarks"],  # Maximum marks of the current assessments
+        "columns": table["schema"]["columns"],  # Inferred type and declared maximum per column
+        # Sequential totals (Sheet Order) for the performance graph
+        "sequentialTotals": all_totals
+    }
+
+# Pagination over the ranking order. Cursors remember the last row sent so a
+# page boundary survives rows being added or re-ranked between requests.
+def _encode_cursor(table, position: int) -> str:
+    import base64
+    idx = table["order"][position - 1]
+    token = dumps_json([position, table["totals"][idx], table["records"][idx].rollNumber])
+    return base64.urlsafe_b64encode(token).decode("ascii").rstrip("=")
+
+def _decode_cursor(table, cursor: str) -> int:
+    """Return the ranking position following the row the cursor points at"""
+    import base64
     try:
-        if not sheets_service:
-            raise Exception("Google Sheets service not initialized")
-            
-        # Get header row
-        header_row = 1
-        sheet_part = "Sheet1"
-        
-        if "!" in range_val:
-            parts = range_val.split("!")
-            sheet_part = parts[0]
-            range_part = parts[1]
-        else:
-            range_part = range_val
-        
-        # Find start row number in range
-        import re
-        match = re.search(r'([0-9]+)', range_part)
-        if match:
-            data_start_row = int(match.group(1))
-            if data_start_row > 1:
-                header_row = data_start_row - 1
-        
-        header_range = f"{sheet_part}!{header_row}:{header_row}"
-        
-        # Get headers
-        header_result = sheets_service.spreadsheets().values().get(
-            spreadsheetId=sheet_id,
-            range=header_range
-        ).execute()
-        header_rows = header_result.get('values', [])
-        headers = header_rows[0][2:] if header_rows and len(header_rows[0]) > 2 else []
-        
-        # Get all student data
-        result = sheets_service.spreadsheets().values().get(
-            spreadsheetId=sheet_id,
-            range=range_val
-        ).execute()
-        rows = result.get('values', [])
-        
-        students = []
-        all_totals = []
-        subject_totals = {header: [] for header in headers if header.lower() != 'total'}
-        
-        # First pass: collect all data
-        for row in rows:
-            if row and len(row) >= 2:
-                roll_no = row[0].strip()
-                name = row[1].strip()
-                raw_marks = row[2:]
-                
-                marks_dict = {}
-                total = 0
-                
-                for i, mark in enumerate(raw_marks):
-                    if i < len(headers):
-                        label = headers[i]
-                        try:
-                            # Try to parse as number
-                            mark_value = float(mark.replace('%', '').strip()) if mark else 0
-                            marks_dict[label] = mark_value
-                            
-                            # Add to subject totals for average calculation
-                            if label.lower() != 'total':
-                                subject_totals[label].append(mark_value)
-                                total += mark_value
-                        except:
-                            marks_dict[label] = mark if mark else '-'
-                
-                # Store total for relative grading
-                all_totals.append(total)
-                
-                students.append({
-                    'rollNumber': roll_no,
-                    'name': name,
-                    'marks': marks_dict,
-                    'total': total
-                })
-        
-        # Calculate class averages
-        class_average = sum(all_totals) / len(all_totals) if all_totals else 0
-        subject_averages = {}
-        
-        for subject, values in subject_totals.items():
-            if values:
-                subject_averages[subject] = sum(values) / len(values)
-        
-        # Second pass: assign relative grades
-        for student in students:
-            student['grade'] = calculate_relative_grade(student['total'], all_totals)
-            # Calculate percentage based on actual current marks (55)
-            # Total course marks = 100 (current 55 + future final 45)
-            # Percentage = (student's current marks / 55) * 100
-            current_marks_maximum = 55  # Actual maximum marks for current assessments
-            student['percentage'] = round((student['total'] / current_marks_maximum) * 100, 2) if current_marks_maximum > 0 else 0
-        
-        # Capture sequential totals (Sheet Order) before sorting for Graph
-        sequential_totals = [s['total'] for s in students]
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position, last_total, last_roll = json.loads(base64.urlsafe_b64decode(padded))
+        position = int(position)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    order = table["order"]
+    totals = table["totals"]
+    records = table["records"]
+
+    # 1. Fast path: nothing moved since the cursor was issued
+    if 0 < position <= len(order):
+        idx = order[position - 1]
+        if records[idx].rollNumber == last_roll and totals[idx] == last_total:
+            return position
+
+    # 2. Row moved: continue right after it
+    for pos, idx in enumerate(order):
+        if records[idx].rollNumber == last_roll:
+            return pos + 1
+
+    # 3. Row is gone: continue with the first lower total
+    for pos, idx in enumerate(order):
+        if totals[idx] < last_total:
+            return pos
+    return len(order)
+
+def sheet_statistics_response(table, sheet_name: str, request: Request, layout: Optional[str] = None,
+                              fmt: Optional[str] = None, offset: int = 0, limit: Optional[int] = None,
+                              cursor: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Send a graded table as one JSON document, or as NDJSON (?format=ndjson):
+    the statistics header on the first line, then one student per line.
+    limit/offset/cursor select a page of the ranking in either mode.
+    """
+    if fmt not in (None, "json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
 
-        # Sort students by total (highest first)
-        students.sort(key=lambda x: x['total'], reverse=True)
-        
-        # Calculate grade distribution for bell curve
-        grade_distribution = {}
-        for student in students:
-            grade = student['grade']
-            grade_distribution[grade] = grade_distribution.get(grade, 0) + 1
-        
-        # Ensure all grades are in distribution (even if count is 0)
-        all_grades = ['A+', 'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'D-', 'F']
-        for grade in all_grades:
-            if grade not in grade_distribution:
-                grade_distribution[grade] = 0
-        
-        return {
+    order = table["order"]
+    paginated = fmt == "ndjson" or limit is not None or offset or cursor
+
+    if not paginated:
+        result = {
             "success": True,
             "sheetName": sheet_name,
-            "students": students,
-            "statistics": {
-                "totalStudents": len(students),
-                "classAverage": round(class_average, 2),
-                "subjectAverages": {k: round(v, 2) for k, v in subject_averages.items()},
-                "highestScore": max(all_totals) if all_totals else 0,
-                "lowestScore": min(all_totals) if all_totals else 0,
-                "headers": headers,
-                "gradeDistribution": grade_distribution,
-                "totalPossibleMarks": 100,
-                "currentMarksTotal": 55,  # Fixed: actual maximum marks for current assessments
-                "sequentialTotals": sequential_totals
-            }
+            "students": [_student_at(table, idx) for idx in order],
+            "statistics": _statistics_block(table)
         }
-    except Exception as e:
-        # Propagate exception
-        raise e
+        return statistics_response(result, request, layout, headers)
+
+    start = _decode_cursor(table, cursor) if cursor else min(offset, len(order))
+    end = len(order) if limit is None else min(start + limit, len(order))
+    page = {
+        "offset": start,
+        "limit": limit,
+        "returned": end - start,
+        "nextCursor": _encode_cursor(table, end) if end < len(order) else None
+    }
+
+    if fmt == "ndjson":
+        header = {
+            "success": True,
+            "sheetName": sheet_name,
+            "statistics": _statistics_block(table),
+            "page": page
+        }
+
+        def stream():
+            yield dumps_json(header) + b"\n"
+            for position in range(start, end):
+                yield dumps_json(_student_at(table, order[position])) + b"\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson", headers=headers)
+
+    result = {
+        "success": True,
+        "sheetName": sheet_name,
+        "students": [_student_at(table, order[position]) for position in range(start, end)],
+        "statistics": _statistics_block(table),
+        "page": page
+    }
+    return statistics_response(result, request, layout, headers)
 
 @app.get("/api/admin/sheet-statistics/{sheet_id}")
-def get_sheet_statistics(sheet_id: str):
+def get_sheet_statistics(sheet_id: str, request: Request, layout: Optional[str] = None,
+                         fmt: Optional[str] = Query(None, alias="format"),
+                         offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1),
+                         cursor: Optional[str] = None):
     """
-    Get all students from a specific sheet with class statistics and relative grades
+    Get all students from a specific sheet with class statistics and relative grades.
+    Pass ?layout=columnar for the compact table layout, ?format=ndjson to stream
+    one student per line, and limit/offset/cursor to page through the ranking.
     """
     try:
         if not sheets_service:
             raise HTTPException(status_code=500, detail="Google Sheets service not initialized")
+
+        # Statistics always use the default (automatic) grading config
+        etag_key = ("sheet-statistics", sheet_id, grading_config_hash(GradingConfig(sheetId=sheet_id)), str(request.url.query))
+        not_modified = check_not_modified(request, etag_key)
+        if not_modified:
+            return not_modified
         
         # Find the source configuration
         sources = get_sheet_sources()
@@ -1609,7 +3761,11 @@ def get_sheet_statistics(sheet_id: str):
         
         sheet_id, range_val, sheet_name = source_config if len(source_config) == 3 else (*source_config, "Unknown")
         
-        return _fetch_sheet_statistics_internal(sheet_id, range_val, sheet_name)
+        snapshot = get_sheet_snapshot(sheet_id, range_val)
+        etag = issue_etag(etag_key, [sources_dependency(), sheet_dependency(sheet_id, range_val, snapshot["version"])])
+        table = get_graded_table(snapshot)
+        return sheet_statistics_response(table, sheet_name, request, layout, fmt, offset, limit, cursor,
+                                         headers={"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL})
         
     except HTTPException:
         raise
@@ -1619,12 +3775,15 @@ def get_sheet_statistics(sheet_id: str):
         raise HTTPException(status_code=500, detail=f"Error fetching sheet statistics: {str(e)}")
 
 @app.post("/api/admin/calculate-grades")
-async def calculate_grades_endpoint(config: GradingConfig):
+async def calculate_grades_endpoint(config: GradingConfig, request: Request, layout: Optional[str] = None,
+                                    fmt: Optional[str] = Query(None, alias="format"),
+                                    offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1),
+                                    cursor: Optional[str] = None):
     """
     Calculate grades based on custom configuration without modifying original GET endpoint.
+    Supports the same layout/format/pagination options as sheet-statistics.
     """
     try:
-        # Reuse logic from get_sheet_statistics (Duplicated to ensure stability of original)
         if not sheets_service:
             raise HTTPException(status_code=500, detail="Google Sheets service not initialized")
         
@@ -1641,111 +3800,300 @@ async def calculate_grades_endpoint(config: GradingConfig):
             sheet_id, range_val = source_config
             sheet_name = "Unknown"
         
-        import re
-        parts = range_val.split("!") if "!" in range_val else ["Sheet1", range_val]
-        sheet_part = parts[0]
-        range_part = parts[1] if len(parts) > 1 else range_val
-        
-        header_row = 1
-        match = re.search(r'([0-9]+)', range_part)
-        if match:
-            data_start_row = int(match.group(1))
-            if data_start_row > 1:
-                header_row = data_start_row - 1
-                
-        header_result = sheets_service.spreadsheets().values().get(
-            spreadsheetId=sheet_id, range=f"{sheet_part}!{header_row}:{header_row}"
-        ).execute()
-        header_rows = header_result.get('values', [])
-        headers = header_rows[0][2:] if header_rows and len(header_rows[0]) > 2 else []
-        
-        result = sheets_service.spreadsheets().values().get(
-            spreadsheetId=sheet_id, range=range_val
-        ).execute()
-        rows = result.get('values', [])
-        
-        students = []
-        all_totals = []
-        subject_totals = {header: [] for header in headers if header.lower() != 'total'}
-        
-        for row in rows:
-            if row and len(row) >= 2:
-                roll_no = row[0].strip()
-                name = row[1].strip()
-                raw_marks = row[2:]
-                marks_dict = {}
-                total = 0
-                for i, mark in enumerate(raw_marks):
-                    if i < len(headers):
-                        label = headers[i]
-                        try:
-                            mark_value = float(mark.replace('%', '').strip()) if mark else 0
-                            marks_dict[label] = mark_value
-                            if label.lower() != 'total':
-                                subject_totals[label].append(mark_value)
-                                total += mark_value
-                        except:
-                            marks_dict[label] = mark if mark else '-'
-                all_totals.append(total)
-                students.append({'rollNumber': roll_no, 'name': name, 'marks': marks_dict, 'total': total})
-        
-        # Calculate Stats
-        class_average = sum(all_totals) / len(all_totals) if all_totals else 0
-        subject_averages = {k: sum(v)/len(v) for k, v in subject_totals.items() if v}
+        snapshot = await run_in_threadpool(get_sheet_snapshot, sheet_id, range_val)
         
         # Determine overrides once
         manual_overrides = None
+        override_version = None
         if config.method == 'manual':
-            manual_overrides = get_manual_overrides(config.sheetId)
-
-        # Assign Custom Grades
-        for student in students:
-            student['grade'] = calculate_custom_grade(
-                student['total'], 
-                all_totals, 
-                config, 
-                roll_number=student['rollNumber'], 
-                manual_overrides=manual_overrides
-            )
-            current_marks_maximum = 55
-            student['percentage'] = round((student['total'] / current_marks_maximum) * 100, 2) if current_marks_maximum > 0 else 0
-        
-        # Capture sequential totals before sorting
-        sequential_totals = [s['total'] for s in students]
+            override_version, manual_overrides = await run_db(get_manual_overrides_versioned, config.sheetId)
 
-        students.sort(key=lambda x: x['total'], reverse=True)
-        
-        grade_distribution = {}
-        for student in students:
-            grade = student['grade']
-            grade_distribution[grade] = grade_distribution.get(grade, 0) + 1
-            
-        all_grades = ['A+', 'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'D-', 'F']
-        for grade in all_grades:
-            if grade not in grade_distribution:
-                grade_distribution[grade] = 0
-                
+        table = await run_in_threadpool(get_graded_table, snapshot, config, manual_overrides, override_version)
+        return sheet_statistics_response(table, sheet_name, request, layout, fmt, offset, limit, cursor)
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error calculating grades: {str(e)}")
+
+# Grade export
+# Rosters are written row by row from the cached graded tables. CSV is
+# streamed straight to the client; XLSX (a zip of XML parts) is written
+# incrementally into a temporary file by a minimal writer and then sent in
+# chunks, so neither format holds the whole document in memory.
+def _export_sections(admin_email: str, sheet_ids: Optional[List[str]], method: str):
+    """[(sheet_id, sheet_name, table)] for the requested (or all) sheets the admin owns"""
+    sources = get_sheet_sources(admin_email)
+    if sheet_ids:
+        wanted = set(sheet_ids)
+        unknown = wanted - {s[0] for s in sources}
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Not one of your sheets: {', '.join(sorted(unknown))}")
+        sources = [s for s in sources if s[0] in wanted]
+    if not sources:
+        raise HTTPException(status_code=404, detail="No sheets to export")
+
+    sections = []
+    for source in sources:
+        sheet_id, range_val = source[0], source[1]
+        sheet_name = source[2] if len(source) > 2 else "Unknown"
+        snapshot = get_sheet_snapshot(sheet_id, range_val)
+        if method == "manual":
+            override_version, overrides = get_manual_overrides_versioned(sheet_id)
+            table = get_graded_table(snapshot, GradingConfig(sheetId=sheet_id, method="manual"), overrides, override_version)
+        else:
+            table = get_graded_table(snapshot)
+        sections.append((sheet_id, sheet_name, table))
+    return sections
+
+def _export_mark_headers(sections) -> List[str]:
+    """Union of the sections' mark columns (first-seen order), Total last"""
+    headers = []
+    for _, _, table in sections:
+        for header in table["headers"]:
+            if header.lower() != 'total' and header not in headers:
+                headers.append(header)
+    return headers
+
+def _export_rows(table, mark_headers):
+    """Roster rows in ranking order: rank, roll, name, marks..., total, percentage, grade"""
+    for idx in table["order"]:
+        student = _student_at(table, idx)
+        marks = student["marks"]
+        yield ([rank_of(table["sortedTotals"], student["total"]), student["rollNumber"], student["name"]]
+               + [marks.get(h, '-') for h in mark_headers]
+               + [round(student["total"], 2), student["percentage"], student["grade"]])
+
+def _export_header_row(mark_headers) -> List[str]:
+    return ["Rank", "Roll Number", "Name"] + mark_headers + ["Total", "Percentage", "Grade"]
+
+def stream_csv_export(sections):
+    import csv
+    import io
+    mark_headers = _export_mark_headers(sections)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["Section"] + _export_header_row(mark_headers))
+    for _, sheet_name, table in sections:
+        for count, row in enumerate(_export_rows(table, mark_headers), 1):
+            writer.writerow([sheet_name] + row)
+            if count % 500 == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+def _xlsx_column(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+# Control characters that XML 1.0 does not allow, even escaped
+_XML_ILLEGAL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _xlsx_cell(ref: str, value) -> str:
+    import math
+    from xml.sax.saxutils import escape
+    # inf/nan have no numeric cell form, so they are written as text
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL_CHARS.sub("", str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+def _xlsx_sheet_names(sections) -> List[str]:
+    """Worksheet names: at most 31 chars, no []:*?/\\, unique"""
+    names = []
+    for _, sheet_name, _ in sections:
+        base = re.sub(r'[\[\]:*?/\\]', ' ', _XML_ILLEGAL_CHARS.sub("", sheet_name)).strip()[:31] or "Sheet"
+        name, n = base, 2
+        while name.lower() in (x.lower() for x in names):
+            suffix = f" ({n})"
+            name, n = base[:31 - len(suffix)] + suffix, n + 1
+        names.append(name)
+    return names
+
+def write_xlsx_export(sections, path: str):
+    """Write one worksheet per section to an .xlsx file, streaming each sheet's XML into the zip"""
+    import zipfile
+    from xml.sax.saxutils import quoteattr
+    names = _xlsx_sheet_names(sections)
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + "".join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                      for i in range(1, len(sections) + 1))
+            + '</Types>'
+        ))
+        archive.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        archive.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + "".join(f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>' for i, name in enumerate(names, 1))
+            + '</sheets></workbook>'
+        ))
+        archive.writestr("xl/_rels/workbook.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                      for i in range(1, len(sections) + 1))
+            + '</Relationships>'
+        ))
+
+        for i, (_, _, table) in enumerate(sections, 1):
+            mark_headers = [h for h in table["headers"] if h.lower() != 'total']
+            with archive.open(f"xl/worksheets/sheet{i}.xml", "w", force_zip64=True) as part:
+                part.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                           b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+                rows = [_export_header_row(mark_headers)]
+                next_row = 1
+                for row in _export_rows(table, mark_headers):
+                    rows.append(row)
+                    if len(rows) >= 500:
+                        part.write(_xlsx_rows(rows, next_row))
+                        next_row += len(rows)
+                        rows = []
+                part.write(_xlsx_rows(rows, next_row))
+                part.write(b'</sheetData></worksheet>')
+
+def _xlsx_rows(rows, first_row: int) -> bytes:
+    out = []
+    for r, row in enumerate(rows, first_row):
+        cells = "".join(_xlsx_cell(f"{_xlsx_column(c)}{r}", value) for c, value in enumerate(row))
+        out.append(f'<row r="{r}">{cells}</row>')
+    return "".join(out).encode("utf-8")
+
+@app.get("/api/admin/export")
+async def export_grades(fmt: str = Query("csv", alias="format"), sheetId: Optional[List[str]] = Query(None), method: str = "automatic",
+                        authorization: Optional[str] = Header(None)):
+    """
+    Download graded rosters. Repeat sheetId to choose sheets (default: every
+    section the admin owns). CSV puts all sections in one table with a Section
+    column; XLSX has one worksheet per section. method: automatic or manual.
+    """
+    admin_email = require_admin(authorization)
+    if fmt not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'xlsx'")
+    if method not in ("automatic", "manual"):
+        raise HTTPException(status_code=400, detail="method must be 'automatic' or 'manual'")
+    if not sheets_service:
+        raise HTTPException(status_code=500, detail="Google Sheets service not initialized")
+
+    sections = await run_in_threadpool(_export_sections, admin_email, sheetId, method)
+    filename = f"grades_{datetime.now().strftime('%Y-%m-%d')}.{fmt}"
+    disposition = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if fmt == "csv":
+        return StreamingResponse(stream_csv_export(sections), media_type="text/csv; charset=utf-8", headers=disposition)
+
+    import tempfile
+    from starlette.background import BackgroundTask
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    try:
+        await run_in_threadpool(write_xlsx_export, sections, path)
+    except Exception:
+        os.unlink(path)
+        raise
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=filename,
+        background=BackgroundTask(os.unlink, path)
+    )
+
+SIMULATION_MAX_CONFIGS = int(os.getenv("SIMULATION_MAX_CONFIGS", "50"))
+
+@app.post("/api/admin/simulate-grades")
+async def simulate_grades(simulation: GradingSimulation):
+    """
+    What-if grading: grade the sheet's cached totals under every candidate config
+    and return each grade distribution plus how it differs from the baseline grades.
+    """
+    try:
+        if not sheets_service:
+            raise HTTPException(status_code=500, detail="Google Sheets service not initialized")
+        if not simulation.configs:
+            raise HTTPException(status_code=400, detail="No configs to simulate")
+        if len(simulation.configs) > SIMULATION_MAX_CONFIGS:
+            raise HTTPException(status_code=400, detail=f"At most {SIMULATION_MAX_CONFIGS} configs per simulation")
+
+        sources = get_sheet_sources()
+        source_config = next((s for s in sources if s[0] == simulation.sheetId), None)
+        if not source_config:
+            raise HTTPException(status_code=404, detail="Sheet not found")
+
+        snapshot = await run_in_threadpool(get_sheet_snapshot, source_config[0], source_config[1])
+        table = await run_in_threadpool(get_graded_table, snapshot)
+        totals = table["totals"]
+        rolls = [record.rollNumber for record in table["records"]]
+
+        candidates = [simulation.baseline] if simulation.baseline else []
+        candidates += simulation.configs
+        manual_overrides = None
+        if any(c.method == 'manual' for c in candidates):
+            manual_overrides = await run_db(get_manual_overrides, simulation.sheetId)
+
+        def grades_for(rules: GradingRules):
+            config = GradingConfig(sheetId=simulation.sheetId, **rules.model_dump())
+            return grade_totals(totals, config, rolls, manual_overrides, table["maxMarks"])
+
+        baseline = grades_for(simulation.baseline) if simulation.baseline else table["grades"]
+
+        results = []
+        for rules in simulation.configs:
+            grades = grades_for(rules)
+            distribution = {grade: 0 for grade in GRADE_ORDER}
+            transitions = {}
+            changed = []
+            for idx, (before, after) in enumerate(zip(baseline, grades)):
+                distribution[after] = distribution.get(after, 0) + 1
+                if before != after:
+                    move = f"{before}->{after}"
+                    transitions[move] = transitions.get(move, 0) + 1
+                    if simulation.includeStudents:
+                        changed.append({"rollNumber": rolls[idx], "from": before, "to": after, "total": totals[idx]})
+            result = {
+                "config": rules.model_dump(),
+                "gradeDistribution": distribution,
+                "changed": sum(transitions.values()),
+                "transitions": transitions
+            }
+            if simulation.includeStudents:
+                result["changedStudents"] = changed
+            results.append(result)
+
+        baseline_distribution = {grade: 0 for grade in GRADE_ORDER}
+        for grade in baseline:
+            baseline_distribution[grade] = baseline_distribution.get(grade, 0) + 1
         return {
             "success": True,
-            "sheetName": sheet_name,
-            "students": students,
-            "statistics": {
-                "totalStudents": len(students),
-                "classAverage": round(class_average, 2),
-                "subjectAverages": {k: round(v, 2) for k, v in subject_averages.items()},
-                "highestScore": max(all_totals) if all_totals else 0,
-                "lowestScore": min(all_totals) if all_totals else 0,
-                "headers": headers,
-                "gradeDistribution": grade_distribution,
-                "totalPossibleMarks": 100,
-                "currentMarksTotal": 55,
-                "sequentialTotals": sequential_totals
-            }
+            "sheetId": simulation.sheetId,
+            "totalStudents": len(totals),
+            "baseline": {"config": simulation.baseline.model_dump() if simulation.baseline else None,
+                         "gradeDistribution": baseline_distribution},
+            "results": results
         }
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Error calculating grades: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error simulating grades: {str(e)}")
 
 
 # Serve static files with absolute path
@@ -1767,16 +4115,27 @@ async def read_admin():
     return FileResponse(os.path.join(public_path, "admin.html"))
 
 @app.get("/api/admin/dashboard")
-async def get_dashboard(authorization: Optional[str] = Header(None)):
+async def get_dashboard(request: Request, response: Response, authorization: Optional[str] = Header(None),
+                        points: int = Query(DASHBOARD_CURVE_POINTS, ge=0, le=5000)):
+    """
+    Admin dashboard. Each section's performanceCurve is downsampled (LTTB) to
+    at most `points` points, with performanceCurveIndex giving the student
+    positions kept; points=0 returns every student.
+    """
     if not authorization:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
         token = authorization.split(" ")[1] if " " in authorization else authorization
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         admin_email = payload.get("sub") or payload.get("email")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    etag_key = ("dashboard", admin_email, grading_config_hash(GradingConfig(sheetId="")), points)
+    not_modified = check_not_modified(request, etag_key)
+    if not_modified:
+        return not_modified
+
     # Fetch admin name from Google Sheet
     admin_name = "Admin"
     try:
@@ -1802,60 +4161,184 @@ async def get_dashboard(authorization: Optional[str] = Header(None)):
             "sections": []
         }
 
-    # 2. Sequential Processing for Dashboard
+    # 2. Read the admin's rollup (only changed sections are re-aggregated)
     import asyncio
     loop = asyncio.get_event_loop()
-    
+    dependencies = [sources_dependency(admin_email)]
+    rollup = await loop.run_in_executor(None, update_dashboard_rollup, admin_email, sources, dependencies)
+
     sections_data = []
-    
+    for section in rollup["ordered"]:
+        entry = {
+            "id": section["sheetId"],
+            "name": section["name"],
+            "totalStudents": section["count"],
+            "classAverage": round(section["classAverage"], 2),
+            "highest": section["max"],
+            "lowest": section["min"],
+            "histogram": section["histogram"],
+            "performanceCurve": section["curve"]
+        }
+        if points and section["count"] > points:
+            entry["performanceCurveIndex"], entry["performanceCurve"] = section_curve(section, points)
+        sections_data.append(entry)
+
+    response.headers["ETag"] = issue_etag(etag_key, dependencies)
+    response.headers["Cache-Control"] = CONDITIONAL_CACHE_CONTROL
+    return {
+        "adminName": admin_name,
+        "adminEmail": admin_email,
+        "totalStudents": rollup["count"],
+        "overallAverage": round(rollup["sum"] / rollup["count"], 2) if rollup["count"] else 0,
+        "highestMarks": rollup["max"],
+        "lowestMarks": rollup["min"],
+        "histogram": {"binWidth": DASHBOARD_HISTOGRAM_BIN_WIDTH, "counts": rollup["histogram"]},
+        "sections": sections_data
+    }
+
+# Dashboard rollups
+# Per admin: count, sum, min, max and a fixed-bin histogram of student totals,
+# per section and overall. When a section's snapshot version changes only that
+# section is re-aggregated: its old contribution is subtracted from the
+# overall figures and the new one added.
+DASHBOARD_HISTOGRAM_BIN_WIDTH = 5
+DASHBOARD_HISTOGRAM_BINS = 20  # the last bin also holds everything above 95
+
+_dashboard_rollups = {}  # admin email -> rollup
+_dashboard_lock = threading.Lock()
+
+def _histogram_bin(total: float) -> int:
+    return min(max(int(total // DASHBOARD_HISTOGRAM_BIN_WIDTH), 0), DASHBOARD_HISTOGRAM_BINS - 1)
+
+def _section_rollup(sheet_id: str, name: str, snapshot) -> Dict[str, Any]:
+    table = get_graded_table(snapshot)
+    totals = table["totals"]
+    histogram = [0] * DASHBOARD_HISTOGRAM_BINS
+    for total in totals:
+        histogram[_histogram_bin(total)] += 1
+    return {
+        "sheetId": sheet_id,
+        "name": name,
+        "version": snapshot["version"],
+        "count": len(totals),
+        "sum": sum(totals),
+        "min": min(totals) if totals else 0,
+        "max": max(totals) if totals else 0,
+        "classAverage": table["classAverage"],
+        "histogram": histogram,
+        # Sequential totals (Sheet Order) for the performance graph
+        "curve": totals,
+        "curves": {}  # points -> downsampled (indices, totals)
+    }
+
+def downsample_lttb(values, threshold: int):
+    """
+    Largest-Triangle-Three-Buckets: keep `threshold` points of a series that
+    preserve its visual shape. Returns (indices, values) of the kept points.
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n)), list(values)
+
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle corner
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = (avg_start + avg_end - 1) / 2
+        avg_y = sum(values[avg_start:avg_end]) / (avg_end - avg_start)
+
+        # Point of this bucket forming the largest triangle with a and the average
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = a, values[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (values[j] - ay) - (ax - j) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept, [values[i] for i in kept]
+
+def section_curve(section, points: int):
+    """Downsampled performance curve of a section, computed once per snapshot version and size"""
+    curves = section["curves"]
+    if points not in curves:
+        curves[points] = downsample_lttb(section["curve"], points)
+    return curves[points]
+
+def _add_section(rollup, section, sign: int):
+    rollup["count"] += sign * section["count"]
+    rollup["sum"] += sign * section["sum"]
+    for i, n in enumerate(section["histogram"]):
+        rollup["histogram"][i] += sign * n
+
+def update_dashboard_rollup(admin_email: str, sources, dependencies: list):
+    """
+    Bring the admin's rollup up to date with the current sources and snapshots.
+    Sheets are read and changed sections graded outside the lock; it is only
+    held while sections are merged into the rollup.
+    """
+    existing = _dashboard_rollups.get(admin_email)
+    prepared = []  # (key, name, snapshot, section or None when unchanged)
     for source in sources:
         if len(source) == 2:
             sh_id, sh_range = source
             sh_name = "Unknown"
         else:
             sh_id, sh_range, sh_name = source
-            
+        key = (sh_id, sh_range)
+
         try:
-            # Run in thread but await result (Sequential)
-            res = await loop.run_in_executor(None, _fetch_sheet_statistics_internal, sh_id, sh_range, sh_name)
-            
-            stats = res["statistics"]
-            student_totals = stats.get("sequentialTotals", [])
-            
-            sections_data.append({
-                "id": sh_id,
-                "name": res["sheetName"],
-                "totalStudents": stats["totalStudents"],
-                "classAverage": stats["classAverage"],
-                "highest": stats["highestScore"],
-                "lowest": stats["lowestScore"],
-                "performanceCurve": student_totals 
-            })
+            snapshot = get_sheet_snapshot(sh_id, sh_range)
+            current = existing["sections"].get(key) if existing else None
+            section = None
+            if current is None or current["version"] != snapshot["version"] or current["name"] != sh_name:
+                section = _section_rollup(sh_id, sh_name, snapshot)
+            prepared.append((key, sh_name, snapshot, section))
+            dependencies.append(sheet_dependency(sh_id, sh_range, snapshot["version"]))
         except Exception as e:
             print(f"Dashboard Error reading {sh_name}: {e}")
-            continue
-
-    # 3. Calculate Overall Aggregates
-    total_students = sum(s["totalStudents"] for s in sections_data)
-    
-    # Weighted average for overall accuracy
-    if total_students > 0:
-        overall_avg = sum(s["classAverage"] * s["totalStudents"] for s in sections_data) / total_students
-    else:
-        overall_avg = 0
-        
-    highest = max((s["highest"] for s in sections_data), default=0)
-    lowest = min((s["lowest"] for s in sections_data), default=0)
-
-    return {
-        "adminName": admin_name,
-        "adminEmail": admin_email,
-        "totalStudents": total_students,
-        "overallAverage": round(overall_avg, 2),
-        "highestMarks": highest,
-        "lowestMarks": lowest,
-        "sections": sections_data
-    }
+            dependencies.append(sheet_dependency(sh_id, sh_range, None))
+
+    with _dashboard_lock:
+        rollup = _dashboard_rollups.get(admin_email)
+        if rollup is None:
+            rollup = {"sections": {}, "count": 0, "sum": 0.0, "min": 0, "max": 0,
+                      "histogram": [0] * DASHBOARD_HISTOGRAM_BINS, "ordered": []}
+            _dashboard_rollups[admin_email] = rollup
+
+        changed = False
+        live = []
+        for key, sh_name, snapshot, section in prepared:
+            current = rollup["sections"].get(key)
+            if current is None or current["version"] != snapshot["version"] or current["name"] != sh_name:
+                # Another request may have merged a different version meanwhile
+                if section is None:
+                    section = _section_rollup(key[0], sh_name, snapshot)
+                if current is not None:
+                    _add_section(rollup, current, -1)
+                _add_section(rollup, section, 1)
+                rollup["sections"][key] = section
+                changed = True
+            live.append(key)
+
+        # Sections that were removed or failed to load drop out of the totals
+        for key in set(rollup["sections"]) - set(live):
+            _add_section(rollup, rollup["sections"].pop(key), -1)
+            changed = True
+
+        if changed:
+            sections = rollup["sections"].values()
+            rollup["max"] = max((s["max"] for s in sections), default=0)
+            rollup["min"] = min((s["min"] for s in sections), default=0)
+        rollup["ordered"] = [rollup["sections"][key] for key in dict.fromkeys(live)]
+        # Copy: the next update changes the rollup in place
+        return dict(rollup, histogram=list(rollup["histogram"]))
 
 # Serve static files
 import os
@@ -1902,7 +4385,33 @@ async def serve_admin_image():
     return FileResponse(os.path.join(BASE_DIR, "admin.png"))
 
 
+def profile_imports(top: int = 25):
+    """Print the heaviest imports of a cold `import main` (python main.py --profile-imports [N])"""
+    import subprocess
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BASE_DIR, capture_output=True, text=True
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        timings.append((int(cumulative_us), int(self_us), name))
+
+    total = next((t for t in timings if t[2] == "main"), None)
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative_us, self_us, name in sorted(timings, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name}")
+    if total:
+        print(f"\nimport main: {total[0] / 1000:.1f}ms")
+
 if __name__ == "__main__":
+    if "--profile-imports" in sys.argv:
+        args = sys.argv[sys.argv.index("--profile-imports") + 1:]
+        profile_imports(int(args[0]) if args and args[0].isdigit() else 25)
+        sys.exit(0)
     import uvicorn
     port = int(os.getenv("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
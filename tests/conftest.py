@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+class FakeSheets:
+    """Stands in for the Sheets API client: serves batchGet from in-memory values"""
+
+    def __init__(self, headers, rows):
+        self.headers = headers
+        self.rows = rows
+        self.fetches = 0
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def batchGet(self, spreadsheetId, ranges):
+        self._ranges = ranges
+        return self
+
+    def execute(self):
+        self.fetches += 1
+        return {"valueRanges": [{"values": [["Roll", "Name"] + list(self.headers)]},
+                                {"values": [list(row) for row in self.rows]}]}
+
+
+@pytest.fixture
+def fake_sheet(monkeypatch):
+    """A single configured source backed by FakeSheets, with all caches empty"""
+    sheets = FakeSheets(["Quiz 1", "Total"], [["001", "Asha", "8", "8"], ["002", "Bilal", "6", "6"]])
+    monkeypatch.setattr(main, "sheets_service", sheets)
+    monkeypatch.setattr(main, "SNAPSHOT_STORE_ENABLED", False)
+    monkeypatch.setattr(main, "get_sheet_sources", lambda owner_email=None: [("sheet-1", "Sheet1!A2:Z", "Test")])
+    main.invalidate_snapshots()
+    main._sheet_schemas.clear()
+    with main._grade_cache_lock:
+        main._grade_cache.clear()
+    yield sheets
+    main.invalidate_snapshots()
@@ -0,0 +1,34 @@
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_conditional_get_refetches_after_snapshot_ttl(fake_sheet, monkeypatch):
+    monkeypatch.setattr(main, "SNAPSHOT_TTL_SECONDS", 0.2)
+    client = TestClient(main.app)
+    url = "/api/admin/sheet-statistics/sheet-1"
+
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    fake_sheet.rows.append(["003", "Chen", "9", "9"])
+    time.sleep(0.3)
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 200
+    assert again.headers["ETag"] != etag
+    assert again.json()["statistics"]["totalStudents"] == 3
+
+
+def test_conditional_get_skips_fetch_while_fresh(fake_sheet):
+    client = TestClient(main.app)
+    url = "/api/admin/sheet-statistics/sheet-1"
+
+    etag = client.get(url).headers["ETag"]
+    fetches = fake_sheet.fetches
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert fake_sheet.fetches == fetches
@@ -0,0 +1,28 @@
+import main
+
+
+def test_max_marks_from_declared_header_maxima():
+    schema = main.SheetSchema(["Quiz 1 (10)", "Mid [20]", "Total"], [["001", "Asha", "8", "15", "23"]], "v1")
+    assert schema.maxMarks == 30
+    assert schema.maximums == [10, 20, None]
+    assert schema.describe()["columns"][1] == {"label": "Mid [20]", "type": "number", "maximum": 20}
+
+
+def test_max_marks_falls_back_when_a_column_has_no_maximum():
+    schema = main.SheetSchema(["Quiz 1 (10)", "Mid", "Total"], [["001", "Asha", "8", "15", "23"]], "v1")
+    assert schema.maxMarks == main.CURRENT_MARKS_MAXIMUM
+
+
+def test_text_columns_do_not_need_a_maximum():
+    schema = main.SheetSchema(["Quiz 1 (10)", "Remarks"], [["001", "Asha", "8", "absent once"]], "v1")
+    assert schema.maxMarks == 10
+
+
+def test_percentage_grading_uses_inferred_max_marks(fake_sheet):
+    fake_sheet.headers = ["Quiz 1 (10)", "Mid [20]"]
+    fake_sheet.rows = [["001", "Asha", "8", "17"]]
+    config = main.GradingConfig(sheetId="sheet-1", method="percentage-based", ranges={"A": 80, "B": 40})
+    snapshot = main.get_sheet_snapshot("sheet-1", "Sheet1!A2:Z")
+    table = main.get_graded_table(snapshot, config)
+    assert table["maxMarks"] == 30
+    assert table["grades"] == ["A"]